@@ -1,9 +1,93 @@
+from typing import Any, Mapping, Optional
+
 from flask import Flask
 
+from .commands import bundle_cli, models_cli
 from .handlers import api
+from .services import (ModelRegistry, ModelService, OperationPool,
+                       PredictionCoalescer, model_service)
+
+
+def create_app(config: Optional[Mapping[str, Any]] = None) -> Flask:
+    app = Flask(__name__)
+    app.config["RESTX_VALIDATE"] = True
+    app.config["RESTX_MASK_SWAGGER"] = False
+    app.config["SWAGGER_UI_DOC_EXPANSION"] = "list"
+    app.config["SPARSE_FEATURES"] = False
+    app.config["SELECT_FEATURES_PER_FOLD"] = False
+    # Coalescing of concurrent single predictions, disabled with a window of 0 ms
+    app.config["PREDICT_BATCH_WINDOW_MS"] = 0
+    app.config["PREDICT_MAX_BATCH_SIZE"] = 32
+    # Larger lists of applicants sent to the batch endpoint are rejected
+    app.config["PREDICT_MAX_APPLICANTS"] = 1000
+    # Admission control per class of operations: how many run at a time, how
+    # many more may wait, and the Retry-After seconds sent with a rejection
+    app.config["PREDICT_CONCURRENCY"] = 16
+    app.config["PREDICT_QUEUE_SIZE"] = 64
+    app.config["TRAIN_CONCURRENCY"] = 1
+    app.config["TRAIN_QUEUE_SIZE"] = 4
+    app.config["LIST_CONCURRENCY"] = 4
+    app.config["LIST_QUEUE_SIZE"] = 16
+    app.config["RETRY_AFTER"] = 5
+    # Binary responses of at least this many bytes are gzipped for clients that
+    # accept it
+    app.config["RESPONSE_GZIP_MIN_SIZE"] = 1024
+    # Training runs in worker processes so that it cannot starve predictions
+    app.config["TRAIN_EXECUTOR"] = "process"
+    # Path of a registry bundle to serve models from instead of the data directory
+    app.config["MODEL_BUNDLE"] = None
+    # If set, models, metadata and encoders are cached in memory, and changes to
+    # their files by any process are seen within this many seconds
+    app.config["REGISTRY_WATCH_INTERVAL"] = None
+    # Most models, metadata and encoders kept in the cache
+    app.config["REGISTRY_CACHE_SIZE"] = 256
+    # Every interval (None disables it), models that have not been predicted
+    # with for MODEL_COLD_AFTER seconds are compressed, and all but the
+    # MODEL_RETENTION most recently used models are deleted if it is set
+    app.config["MODEL_COMPACTION_INTERVAL"] = None
+    app.config["MODEL_COLD_AFTER"] = 7 * 24 * 60 * 60
+    app.config["MODEL_RETENTION"] = None
+    if config:
+        app.config.update(config)
+
+    api.init_app(app)
+    app.cli.add_command(bundle_cli)
+    app.cli.add_command(models_cli)
+    registry = app.extensions["model_registry"] = ModelRegistry(
+        max_size=app.config["REGISTRY_CACHE_SIZE"]
+    )
+    registry.use_bundle(app.config.get("MODEL_BUNDLE"))
+    # A bundle cannot change, so it needs no watcher nor compaction
+    if not registry.bundle:
+        registry.watch(model_service.data_dir, app.config["REGISTRY_WATCH_INTERVAL"])
+        if app.config["MODEL_COMPACTION_INTERVAL"] is not None:
+            app.extensions["model_compaction"] = ModelService.schedule_compaction(
+                app,
+                app.config["MODEL_COMPACTION_INTERVAL"],
+                cold_after=app.config["MODEL_COLD_AFTER"],
+                keep=app.config["MODEL_RETENTION"],
+            )
+    app.extensions["operation_pools"] = {
+        operation: OperationPool(
+            operation,
+            concurrency=app.config[f"{operation.upper()}_CONCURRENCY"],
+            queue_size=app.config[f"{operation.upper()}_QUEUE_SIZE"],
+            retry_after=app.config["RETRY_AFTER"],
+            executor=app.config["TRAIN_EXECUTOR"] if operation == "train" else None,
+        )
+        for operation in ["predict", "train", "list"]
+    }
+    # Coalesced batches are admitted to the predict pool as one operation each
+    app.extensions["prediction_coalescer"] = (
+        PredictionCoalescer(
+            window=app.config["PREDICT_BATCH_WINDOW_MS"] / 1000,
+            max_batch_size=app.config["PREDICT_MAX_BATCH_SIZE"],
+            pool=app.extensions["operation_pools"]["predict"],
+        )
+        if app.config["PREDICT_BATCH_WINDOW_MS"] > 0
+        else None
+    )
+    return app
+
 
-app = Flask(__name__)
-app.config["RESTX_VALIDATE"] = True
-app.config["RESTX_MASK_SWAGGER"] = False
-app.config["SWAGGER_UI_DOC_EXPANSION"] = "list"
-api.init_app(app)
+app = create_app()
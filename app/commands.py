@@ -0,0 +1,57 @@
+from typing import Optional
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+from .dtos import StorageReport
+from .services import ModelService, model_bundle, model_service
+
+bundle_cli = AppGroup("bundle", help="Pack and unpack the model registry.")
+
+
+@bundle_cli.command("export")
+@click.argument("path", type=click.Path(dir_okay=False))
+def export_command(path: str) -> None:
+    """Packs the models, encoders and ranked features into a bundle file."""
+    count = model_bundle.export_bundle(model_service.data_dir, path)
+    click.echo(f"Exported {count} files to {path}")
+
+
+@bundle_cli.command("import")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+def import_command(path: str) -> None:
+    """Unpacks a bundle file into the data directory."""
+    count = model_bundle.import_bundle(path, model_service.data_dir)
+    click.echo(f"Imported {count} files from {path}")
+
+
+models_cli = AppGroup("models", help="Manage the storage of the models.")
+
+
+@models_cli.command("compact")
+@click.option(
+    "--cold-after",
+    type=float,
+    help="Compress models not predicted with for this many seconds.",
+)
+@click.option("--keep", type=int, help="Delete all but this many models.")
+def compact_command(cold_after: Optional[float], keep: Optional[int]) -> None:
+    """Moves cold models to compressed storage and applies the retention."""
+    config = current_app.config
+    report = ModelService.compact_models(
+        cold_after if cold_after is not None else config["MODEL_COLD_AFTER"],
+        keep if keep is not None else config["MODEL_RETENTION"],
+    )
+    _echo_tiers(report)
+
+
+@models_cli.command("storage")
+def storage_command() -> None:
+    """Reports the disk usage of every storage tier."""
+    _echo_tiers(ModelService.get_storage_report())
+
+
+def _echo_tiers(report: StorageReport) -> None:
+    for tier in report.tiers:
+        click.echo(f"{tier.tier}: {tier.models} models, {tier.size} bytes")
@@ -1,4 +1,12 @@
 from .applicant import Applicant, ApplicantFields
+from .drift import (DriftReport, DriftReportFields, FeatureDrift,
+                    FeatureDriftFields)
+from .feature_curve import (FeatureCurve, FeatureCurveFields,
+                            FeatureCurveMetadata, FeatureCurveMetadataFields,
+                            FeatureCurvePoint, FeatureCurvePointFields)
 from .model_metadata import ModelMetadata, ModelMetadataFields
-from .prediction import PredictionResult, PredictionResultFields
+from .prediction import (FeatureContribution, FeatureContributionFields,
+                         PredictionResult, PredictionResultFields)
+from .storage import (ModelStorage, ModelStorageFields, StorageReport,
+                      StorageTier, StorageTierFields)
 from .train import TrainResult, TrainResultFields
@@ -0,0 +1,41 @@
+from dataclasses import dataclass
+from typing import List
+
+from flask_restx import fields
+
+
+@dataclass(frozen=True)
+class FeatureDrift:
+    feature: str
+    divergence: float
+
+
+@dataclass(frozen=True)
+class DriftReport:
+    samples: int
+    features: List[FeatureDrift]
+
+
+@dataclass(frozen=True)
+class FeatureDriftFields:
+    feature: fields.String = fields.String(
+        title="Feature",
+        description="The name of the applicant field",
+        required=True,
+    )
+    divergence: fields.Float = fields.Float(
+        title="Divergence",
+        description="Jensen-Shannon divergence (base 2) between the served and the training distribution of the field",
+        required=True,
+        min=0.0,
+        max=1.0,
+    )
+
+
+@dataclass(frozen=True)
+class DriftReportFields:
+    samples: fields.Integer = fields.Integer(
+        title="Samples",
+        description="The number of applicants scored since the service started",
+        required=True,
+    )
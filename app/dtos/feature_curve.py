@@ -0,0 +1,91 @@
+from dataclasses import dataclass
+from typing import List, Optional
+
+from flask_restx import fields
+
+
+@dataclass(frozen=True)
+class FeatureCurveMetadata:
+    model_class: str
+    score_func: str
+    k: int
+    compare: bool = False
+
+
+@dataclass(frozen=True)
+class FeatureCurvePoint:
+    num_features: int
+    train_acc: float
+    valid_acc: float
+
+
+@dataclass(frozen=True)
+class FeatureCurve:
+    points: List[FeatureCurvePoint]
+    elapsed_time: float
+    time_saved: Optional[float] = None
+
+
+@dataclass(frozen=True)
+class FeatureCurveMetadataFields:
+    model_class: fields.String = fields.String(
+        title="Model class",
+        description="The name of the model class",
+        enum=["logistic", "linear"],
+        required=True,
+    )
+    score_func: fields.String = fields.String(
+        title="Score function",
+        description="The score function whose ranked features are evaluated",
+        enum=[
+            "f_regression",
+            "mutual_info_regression",
+            "f_classif",
+            "mutual_info_classif",
+            "chi2",
+        ],
+        required=True,
+    )
+    k: fields.Integer = fields.Integer(
+        title="K-fold cross validation",
+        description="Value used in K-fold cross validation",
+        min=2,
+        required=True,
+    )
+    compare: fields.Boolean = fields.Boolean(
+        title="Compare",
+        description="Also train every number of features separately to report the time saved",
+        default=False,
+    )
+
+
+@dataclass(frozen=True)
+class FeatureCurvePointFields:
+    num_features: fields.Integer = fields.Integer(
+        title="Number of features",
+        description="The number of top ranked features used",
+        required=True,
+    )
+    train_acc: fields.Float = fields.Float(
+        title="Training accuracy",
+        description="Model accuracy tested on training set",
+        required=True,
+    )
+    valid_acc: fields.Float = fields.Float(
+        title="Validation accuracy",
+        description="Model accuracy tested on validation set",
+        required=True,
+    )
+
+
+@dataclass(frozen=True)
+class FeatureCurveFields:
+    elapsed_time: fields.Float = fields.Float(
+        title="Elapsed time",
+        description="Seconds taken to evaluate every number of features",
+        required=True,
+    )
+    time_saved: fields.Float = fields.Float(
+        title="Time saved",
+        description="Seconds saved compared to training every number of features separately, if compared",
+    )
@@ -1,12 +1,35 @@
 from dataclasses import dataclass
+from typing import List, Optional
 
 from flask_restx import fields
 
 
+@dataclass(frozen=True)
+class FeatureContribution:
+    feature: str
+    contribution: float
+
+
 @dataclass(frozen=True)
 class PredictionResult:
     model_id: str
     success: bool
+    intercept: Optional[float] = None
+    contributions: Optional[List[FeatureContribution]] = None
+
+
+@dataclass(frozen=True)
+class FeatureContributionFields:
+    feature: fields.String = fields.String(
+        title="Feature",
+        description="The name of the encoded feature",
+        required=True,
+    )
+    contribution: fields.Float = fields.Float(
+        title="Contribution",
+        description="The coefficient of the feature times its encoded value",
+        required=True,
+    )
 
 
 @dataclass(frozen=True)
@@ -21,3 +44,7 @@ class PredictionResultFields:
         description="The success of the given applicant predicted by the model",
         required=True,
     )
+    intercept: fields.Float = fields.Float(
+        title="Intercept",
+        description="The intercept of the model, only when explained. Together with the contributions, it adds up to the predicted final grade of linear models or the log-odds of success of logistic models",
+    )
@@ -0,0 +1,70 @@
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Optional
+
+from flask_restx import fields
+
+
+@dataclass(frozen=True)
+class ModelStorage:
+    model_id: str
+    tier: str
+    size: int
+    hits: int
+    last_predicted: Optional[datetime]
+
+
+@dataclass(frozen=True)
+class StorageTier:
+    tier: str
+    models: int
+    size: int
+
+
+@dataclass(frozen=True)
+class StorageReport:
+    tiers: List[StorageTier]
+    models: List[ModelStorage]
+
+
+@dataclass(frozen=True)
+class ModelStorageFields:
+    model_id: fields.String = fields.String(
+        title="Model ID", description="The ID of the model", required=True
+    )
+    tier: fields.String = fields.String(
+        title="Tier",
+        description="Where the model is stored (hot - uncompressed, cold - compressed)",
+        enum=["hot", "cold"],
+        required=True,
+    )
+    size: fields.Integer = fields.Integer(
+        title="Size", description="Size of the model on disk in bytes", required=True
+    )
+    hits: fields.Integer = fields.Integer(
+        title="Hits",
+        description="The number of applicants scored with the model",
+        required=True,
+    )
+    last_predicted: fields.DateTime = fields.DateTime(
+        title="Last predicted",
+        description="When the model was last used for a prediction, if ever",
+    )
+
+
+@dataclass(frozen=True)
+class StorageTierFields:
+    tier: fields.String = fields.String(
+        title="Tier",
+        description="The storage tier (hot - uncompressed, cold - compressed)",
+        enum=["hot", "cold"],
+        required=True,
+    )
+    models: fields.Integer = fields.Integer(
+        title="Models", description="The number of models in the tier", required=True
+    )
+    size: fields.Integer = fields.Integer(
+        title="Size",
+        description="Disk usage of the models in the tier in bytes",
+        required=True,
+    )
@@ -0,0 +1,151 @@
+import dataclasses
+import functools
+import gzip
+import importlib.util
+from typing import Any, Callable, Dict, List
+
+from flask import Response, current_app, request
+from flask_restx import Model, Namespace
+from flask_restx import fields as restx_fields
+from flask_restx.utils import unpack
+
+json_type = "application/json"
+msgpack_type = "application/msgpack"
+arrow_type = "application/vnd.apache.arrow.stream"
+
+# Binary encodings are optional and only offered if their module is installed
+encoding_modules = {msgpack_type: "msgpack", arrow_type: "pyarrow"}
+
+arrow_types = {
+    restx_fields.String: "string",
+    restx_fields.Integer: "int64",
+    restx_fields.Float: "float64",
+    restx_fields.Boolean: "bool_",
+}
+
+
+@functools.lru_cache(maxsize=None)
+def available_media_types() -> List[str]:
+    # JSON comes first, so it is chosen unless a binary encoding is preferred
+    return [json_type] + [
+        media_type
+        for media_type, module in encoding_modules.items()
+        if importlib.util.find_spec(module)
+    ]
+
+
+def _plain(value: Any) -> Any:
+    # Nested dataclasses become dicts, all other values are kept as they are
+    if dataclasses.is_dataclass(value):
+        return dataclasses.asdict(value)
+    if isinstance(value, list):
+        return [_plain(item) for item in value]
+    return value
+
+
+def _encode_msgpack(model: Model, data: Any, as_list: bool, skip_none: bool) -> bytes:
+    import msgpack
+
+    # Same structure as the JSON response, read straight from the dataclasses
+    names = list(model)
+
+    def encode(item: Any) -> Dict[str, Any]:
+        values = {name: _plain(getattr(item, name)) for name in names}
+        if skip_none:
+            return {name: value for name, value in values.items() if value is not None}
+        return values
+
+    return msgpack.packb([encode(item) for item in data] if as_list else encode(data))
+
+
+def _arrow_type(field: restx_fields.Raw) -> Any:
+    import pyarrow as pa
+
+    if isinstance(field, restx_fields.List):
+        return pa.list_(_arrow_type(field.container))
+    if isinstance(field, restx_fields.Nested):
+        return pa.struct(
+            [
+                pa.field(name, _arrow_type(nested), nullable=not nested.required)
+                for name, nested in field.nested.items()
+            ]
+        )
+    return getattr(pa, arrow_types[type(field)])()
+
+
+def _encode_arrow(model: Model, data: Any, as_list: bool, skip_none: bool) -> bytes:
+    import pyarrow as pa
+
+    # One record batch with a column per field of the model, in which missing
+    # values are always null
+    items = data if as_list else [data]
+    schema = pa.schema(
+        [
+            pa.field(name, _arrow_type(field), nullable=not field.required)
+            for name, field in model.items()
+        ]
+    )
+    columns = [
+        pa.array([_plain(getattr(item, field.name)) for item in items], type=field.type)
+        for field in schema
+    ]
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        writer.write_batch(pa.record_batch(columns, schema=schema))
+    return sink.getvalue().to_pybytes()
+
+
+encoders: Dict[str, Callable[[Model, Any, bool, bool], bytes]] = {
+    msgpack_type: _encode_msgpack,
+    arrow_type: _encode_arrow,
+}
+
+
+def negotiate(
+    api: Namespace,
+    model: Model,
+    as_list: bool = False,
+    code: int = 200,
+    skip_none: bool = False,
+) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    """Like ``marshal_with``, but encodes the response as the client prefers.
+
+    JSON responses are marshalled as before. Binary encodings are written
+    directly from the returned dataclasses without marshalling every object,
+    and compressed with gzip if the client accepts it and the response is at
+    least ``RESPONSE_GZIP_MIN_SIZE`` bytes.
+    """
+
+    def decorator(func: Callable[..., Any]) -> Callable[..., Any]:
+        marshalled = api.produces([json_type] + list(encoding_modules))(
+            api.marshal_with(model, as_list=as_list, code=code, skip_none=skip_none)(
+                func
+            )
+        )
+
+        @functools.wraps(marshalled)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            media_type = request.accept_mimetypes.best_match(available_media_types())
+            if media_type in (None, json_type):
+                data, status, headers = unpack(marshalled(*args, **kwargs))
+                return data, status, {**headers, "Vary": "Accept"}
+
+            data, status, headers = unpack(func(*args, **kwargs))
+            body = encoders[media_type](model, data, as_list, skip_none)
+            response = Response(body, status=status, headers=headers)
+            response.content_type = media_type
+            response.vary.update(["Accept", "Accept-Encoding"])
+            if (
+                "gzip" in request.accept_encodings
+                and len(body) >= current_app.config["RESPONSE_GZIP_MIN_SIZE"]
+            ):
+                # The fastest level, as the repetitive keys and IDs compress well
+                compressed = gzip.compress(body, compresslevel=1)
+                if len(compressed) < len(body):
+                    response.set_data(compressed)
+                    response.content_encoding = "gzip"
+            return response
+
+        return wrapper
+
+    return decorator
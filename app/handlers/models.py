@@ -1,19 +1,36 @@
 import uuid
-from dataclasses import asdict, fields
-from typing import List, Tuple
+from contextlib import contextmanager
+from dataclasses import asdict
+from typing import Any, Callable, Iterator, List, Optional, Tuple, TypeVar
 
-from flask_restx import Namespace, Resource, reqparse
+from flask import current_app
+from flask_restx import Namespace, Resource
+from flask_restx import fields as restx_fields
+from flask_restx import inputs, reqparse
+from werkzeug.exceptions import TooManyRequests
 
-from app.dtos import (Applicant, ApplicantFields, ModelMetadata,
-                      ModelMetadataFields, PredictionResult,
-                      PredictionResultFields, TrainResult, TrainResultFields)
+from app.dtos import (Applicant, ApplicantFields, DriftReport,
+                      DriftReportFields, FeatureContributionFields,
+                      FeatureCurve, FeatureCurveFields, FeatureCurveMetadata,
+                      FeatureCurveMetadataFields, FeatureCurvePointFields,
+                      FeatureDriftFields, ModelMetadata, ModelMetadataFields,
+                      ModelStorageFields, PredictionResult,
+                      PredictionResultFields, StorageReport, StorageTierFields,
+                      TrainResult, TrainResultFields)
 from app.dtos.train import TrainMetadata, TrainMetadataFields
-from app.services import ModelService
+from app.handlers.encodings import negotiate
+from app.handlers.validation import PayloadValidator
+from app.services import (AdmissionRejected, ModelService, OperationPool,
+                          PredictionCoalescer)
+
+T = TypeVar("T")
 
 api = Namespace(
     name="models", description="API endpoints to manage machine learning models"
 )
 applicant_model = api.model(name="Applicant", model=asdict(ApplicantFields()))
+# Applicants are validated by a precompiled validator instead of RESTX_VALIDATE
+applicant_validator = PayloadValidator(Applicant, applicant_model)
 train_metadata_model = api.model(
     name="TrainMetadata", model=asdict(TrainMetadataFields())
 )
@@ -21,21 +38,101 @@ model_metadata_model = api.model(
     name="ModelMetadata", model=asdict(ModelMetadataFields())
 )
 train_result_model = api.model(name="TrainResult", model=asdict(TrainResultFields()))
+feature_contribution_model = api.model(
+    name="FeatureContribution", model=asdict(FeatureContributionFields())
+)
 prediction_result_model = api.model(
-    name="PredictionResult", model=asdict(PredictionResultFields())
+    name="PredictionResult",
+    model={
+        **asdict(PredictionResultFields()),
+        "contributions": restx_fields.List(
+            restx_fields.Nested(feature_contribution_model),
+            description="Contribution of every feature used by the model, only when explained",
+        ),
+    },
+)
+explain_parser = reqparse.RequestParser()
+explain_parser.add_argument(
+    "explain",
+    type=inputs.boolean,
+    default=False,
+    location="args",
+    help="Whether to return the contribution of every feature to the prediction",
+)
+feature_curve_metadata_model = api.model(
+    name="FeatureCurveMetadata", model=asdict(FeatureCurveMetadataFields())
+)
+feature_curve_point_model = api.model(
+    name="FeatureCurvePoint", model=asdict(FeatureCurvePointFields())
+)
+feature_curve_model = api.model(
+    name="FeatureCurve",
+    model={
+        **asdict(FeatureCurveFields()),
+        "points": restx_fields.List(
+            restx_fields.Nested(feature_curve_point_model),
+            description="Training and validation accuracy for every number of features",
+            required=True,
+        ),
+    },
+)
+feature_drift_model = api.model(name="FeatureDrift", model=asdict(FeatureDriftFields()))
+drift_report_model = api.model(
+    name="DriftReport",
+    model={
+        **asdict(DriftReportFields()),
+        "features": restx_fields.List(
+            restx_fields.Nested(feature_drift_model),
+            description="Divergence of every applicant field",
+            required=True,
+        ),
+    },
 )
+model_storage_model = api.model(name="ModelStorage", model=asdict(ModelStorageFields()))
+storage_tier_model = api.model(name="StorageTier", model=asdict(StorageTierFields()))
+storage_report_model = api.model(
+    name="StorageReport",
+    model={
+        "tiers": restx_fields.List(
+            restx_fields.Nested(storage_tier_model),
+            description="Disk usage of every storage tier",
+            required=True,
+        ),
+        "models": restx_fields.List(
+            restx_fields.Nested(model_storage_model),
+            description="Storage and usage of every model",
+            required=True,
+        ),
+    },
+)
+
+
+@contextmanager
+def rejected_as_429() -> Iterator[None]:
+    try:
+        yield
+    except AdmissionRejected as e:
+        raise TooManyRequests(description=str(e), retry_after=e.retry_after)
+
+
+def admit(operation: str, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    pool: OperationPool = current_app.extensions["operation_pools"][operation]
+    with rejected_as_429():
+        return pool.run(func, *args, **kwargs)
 
 
 @api.route("")
 class ModelList(Resource):
-    @api.marshal_with(model_metadata_model, as_list=True, code=200)
+    @negotiate(api, model_metadata_model, as_list=True, code=200)
+    @api.response(429, "Too many requests")
     def get(self) -> Tuple[List[ModelMetadata], int]:
         """Gets a list of all the models"""
-        return ModelService.get_model_list(), 200
+        return admit("list", ModelService.get_model_list), 200
 
     @api.expect(train_metadata_model)
     @api.marshal_with(train_result_model, code=201)
     @api.response(400, "Invalid input")
+    @api.response(429, "Too many requests")
     def post(self) -> Tuple[TrainResult, int]:
         """Creates and trains a model with given model class and hyperparameters"""
         parser = reqparse.RequestParser()
@@ -46,14 +143,20 @@ class ModelList(Resource):
         args = parser.parse_args()
 
         try:
+            # Checked here since training may run in a process without the bundle
+            ModelService.check_writable()
             return (
-                ModelService.train(
+                admit(
+                    "train",
+                    ModelService.train,
                     TrainMetadata(
                         model_class=args["model_class"],
                         score_func=args["score_func"],
                         num_features=args["num_features"],
                         k=args["k"],
-                    )
+                    ),
+                    sparse=current_app.config["SPARSE_FEATURES"],
+                    select_per_fold=current_app.config["SELECT_FEATURES_PER_FOLD"],
                 ),
                 201,
             )
@@ -61,6 +164,57 @@ class ModelList(Resource):
             api.abort(400, str(e))
 
 
+@api.route("/curve")
+class ModelFeatureCurve(Resource):
+    @api.expect(feature_curve_metadata_model)
+    @api.marshal_with(feature_curve_model, code=200)
+    @api.response(400, "Invalid input")
+    @api.response(429, "Too many requests")
+    def post(self) -> Tuple[FeatureCurve, int]:
+        """Evaluates a model class for every number of ranked features in one pass"""
+        parser = reqparse.RequestParser()
+        parser.add_argument("model_class", required=True, type=str)
+        parser.add_argument("score_func", required=True, type=str)
+        parser.add_argument("k", required=True, type=int)
+        parser.add_argument("compare", type=inputs.boolean, default=False)
+        args = parser.parse_args()
+
+        try:
+            return (
+                admit(
+                    "train",
+                    ModelService.evaluate_feature_curve,
+                    FeatureCurveMetadata(
+                        model_class=args["model_class"],
+                        score_func=args["score_func"],
+                        k=args["k"],
+                        compare=args["compare"],
+                    ),
+                ),
+                200,
+            )
+        except ValueError as e:
+            api.abort(400, str(e))
+
+
+@api.route("/drift")
+class ApplicantDrift(Resource):
+    @api.marshal_with(drift_report_model, code=200)
+    @api.response(429, "Too many requests")
+    def get(self) -> Tuple[DriftReport, int]:
+        """Compares the scored applicants with the applicants of the training dataset"""
+        return admit("list", ModelService.get_drift_report), 200
+
+
+@api.route("/storage")
+class ModelStorageReport(Resource):
+    @api.marshal_with(storage_report_model, code=200)
+    @api.response(429, "Too many requests")
+    def get(self) -> Tuple[StorageReport, int]:
+        """Reports the storage tier, disk usage and usage of the models"""
+        return admit("list", ModelService.get_storage_report), 200
+
+
 @api.route("/<model_id>")
 @api.param("model_id", description="The model ID")
 class Model(Resource):
@@ -88,19 +242,25 @@ class Model(Resource):
             api.abort(400, "Invalid model ID")
         if not ModelService.get_model(model_id):
             api.abort(404, "Model does not exist")
-        ModelService.delete(model_id)
+        try:
+            ModelService.delete(model_id)
+        except ValueError as e:
+            api.abort(400, str(e))
         return "", 204
 
 
 @api.route("/<model_id>/predict")
 @api.param("model_id", description="The model ID")
 class ModelPrediction(Resource):
-    @api.expect(applicant_model)
-    @api.marshal_with(prediction_result_model, code=200)
+    @api.expect(applicant_model, explain_parser, validate=False)
+    @api.marshal_with(prediction_result_model, code=200, skip_none=True)
     @api.response(400, "Invalid input")
     @api.response(404, "Model does not exist")
+    @api.response(429, "Too many requests")
     def post(self, model_id: str) -> Tuple[PredictionResult, int]:
         """Predicts the success of an applicant using a given model"""
+        applicant = applicant_validator.parse(api.payload)
+        explain = explain_parser.parse_args()["explain"]
         try:
             uuid.UUID(model_id, version=4)
         except ValueError:
@@ -108,14 +268,64 @@ class ModelPrediction(Resource):
         model_metadata = ModelService.get_model(model_id)
         if not model_metadata:
             api.abort(404, "Model does not exist")
+        coalescer: Optional[PredictionCoalescer] = current_app.extensions[
+            "prediction_coalescer"
+        ]
+        try:
+            # Explained predictions are not coalesced with plain ones, and the
+            # coalescer admits whole batches instead of every request
+            if coalescer and not explain:
+                with rejected_as_429():
+                    result = coalescer.predict(model_id, model_metadata, applicant)
+            else:
+                result = admit(
+                    "predict",
+                    ModelService.predict,
+                    model_id,
+                    model_metadata,
+                    applicant,
+                    explain=explain,
+                )
+            return result, 200
+        except ValueError as e:
+            api.abort(400, str(e))
 
-        parser = reqparse.RequestParser()
-        for field in fields(Applicant):
-            parser.add_argument(field.name, type=field.type, location="json")
-        args = parser.parse_args()
+
+@api.route("/<model_id>/predict/batch")
+@api.param("model_id", description="The model ID")
+class ModelBatchPrediction(Resource):
+    @api.expect([applicant_model], explain_parser, validate=False)
+    @negotiate(api, prediction_result_model, as_list=True, code=200, skip_none=True)
+    @api.response(400, "Invalid input")
+    @api.response(404, "Model does not exist")
+    @api.response(413, "Too many applicants")
+    @api.response(429, "Too many requests")
+    def post(self, model_id: str) -> Tuple[List[PredictionResult], int]:
+        """Predicts the success of a list of applicants using a given model"""
+        max_applicants = current_app.config["PREDICT_MAX_APPLICANTS"]
+        if isinstance(api.payload, list) and len(api.payload) > max_applicants:
+            api.abort(
+                413, f"At most {max_applicants} applicants can be predicted at once"
+            )
+        applicants = applicant_validator.parse_list(api.payload)
+        explain = explain_parser.parse_args()["explain"]
+        try:
+            uuid.UUID(model_id, version=4)
+        except ValueError:
+            api.abort(400, "Invalid model ID")
+        model_metadata = ModelService.get_model(model_id)
+        if not model_metadata:
+            api.abort(404, "Model does not exist")
         try:
             return (
-                ModelService.predict(model_id, model_metadata, Applicant(**args)),
+                admit(
+                    "predict",
+                    ModelService.predict_batch,
+                    model_id,
+                    model_metadata,
+                    applicants,
+                    explain=explain,
+                ),
                 200,
             )
         except ValueError as e:
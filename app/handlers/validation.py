@@ -0,0 +1,88 @@
+from typing import (Any, Callable, Generic, List, Mapping, Optional, Type,
+                    TypeVar)
+
+from flask_restx import abort
+from flask_restx import fields as restx_fields
+
+T = TypeVar("T")
+
+Check = Callable[[Any], Optional[str]]
+
+
+def _compile_check(field: restx_fields.Raw) -> Check:
+    # Same checks and messages as the JSON schema validation of Flask-RESTX
+    if isinstance(field, restx_fields.Integer):
+        minimum, maximum = field.minimum, field.maximum
+
+        def check(value: Any) -> Optional[str]:
+            if type(value) is not int:
+                return f"{value!r} is not of type 'integer'"
+            if minimum is not None and value < minimum:
+                return f"{value!r} is less than the minimum of {minimum!r}"
+            if maximum is not None and value > maximum:
+                return f"{value!r} is greater than the maximum of {maximum!r}"
+            return None
+
+    elif isinstance(field, restx_fields.String) and field.enum:
+        enum = list(field.enum)
+        values = frozenset(enum)
+
+        def check(value: Any) -> Optional[str]:
+            if type(value) is not str or value not in values:
+                return f"{value!r} is not one of {enum!r}"
+            return None
+
+    elif isinstance(field, restx_fields.String):
+
+        def check(value: Any) -> Optional[str]:
+            if type(value) is not str:
+                return f"{value!r} is not of type 'string'"
+            return None
+
+    else:
+        raise TypeError(f"Unsupported field: {type(field).__name__}")
+    return check
+
+
+class PayloadValidator(Generic[T]):
+    """Validates JSON payloads against a model and builds its dataclass.
+
+    The checks of every field are compiled once, so a payload is validated and
+    converted in a single pass. Invalid payloads are rejected with the same
+    errors as the validation of ``api.expect`` with ``validate=True``.
+    """
+
+    def __init__(self, dataclass: Type[T], model: Mapping[str, restx_fields.Raw]):
+        self.dataclass = dataclass
+        self._names = list(model)
+        self._required = sorted(name for name, field in model.items() if field.required)
+        self._checks = [(name, _compile_check(field)) for name, field in model.items()]
+
+    def parse(self, payload: Any) -> T:
+        if type(payload) is not dict:
+            self._abort({"": f"{payload!r} is not of type 'object'"})
+        errors = {
+            name: f"{name!r} is a required property"
+            for name in self._required
+            if name not in payload
+        }
+        for name, check in self._checks:
+            if name in payload:
+                error = check(payload[name])
+                if error:
+                    errors[name] = error
+        if errors:
+            self._abort(errors)
+        return self.dataclass(**{name: payload.get(name) for name in self._names})
+
+    def parse_list(self, payload: Any) -> List[T]:
+        # A single object is accepted as a list of one, and the first invalid
+        # object is reported
+        return [
+            self.parse(item)
+            for item in (payload if isinstance(payload, list) else [payload])
+        ]
+
+    @staticmethod
+    def _abort(errors: Mapping[str, str]) -> None:
+        abort(400, message="Input payload validation failed", errors=errors)
@@ -1 +1,7 @@
+from .admission import AdmissionRejected, OperationPool
+from .drift_monitor import DriftMonitor
+from .model_bundle import ModelBundle
+from .model_registry import ModelRegistry
 from .model_service import ModelService
+from .prediction_coalescer import PredictionCoalescer
+from .registry_watcher import RegistryWatcher
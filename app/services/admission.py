@@ -0,0 +1,95 @@
+import multiprocessing
+import threading
+from concurrent.futures import (Executor, ProcessPoolExecutor,
+                                ThreadPoolExecutor)
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, operation: str, retry_after: int) -> None:
+        super().__init__(f"Too many {operation} requests in flight, try again later")
+        self.operation = operation
+        self.retry_after = retry_after
+
+
+class OperationPool:
+    """Admission control for one class of operations.
+
+    At most ``concurrency`` operations run at a time and at most ``queue_size``
+    more wait for a free slot; any further operation is rejected right away.
+    Operations run in the calling thread unless the pool has its own executor,
+    which is used to keep CPU-heavy work off the request threads.
+    """
+
+    def __init__(
+        self,
+        operation: str,
+        concurrency: int,
+        queue_size: int,
+        retry_after: int,
+        executor: Optional[str] = None,
+    ) -> None:
+        self.operation = operation
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.retry_after = retry_after
+        self._executor_type = executor
+        self._executor: Optional[Executor] = None
+        self._executor_lock = threading.Lock()
+        self._running = threading.BoundedSemaphore(concurrency)
+        self._admitted = threading.BoundedSemaphore(concurrency + queue_size)
+
+    def run(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        if not self._admitted.acquire(blocking=False):
+            raise AdmissionRejected(self.operation, self.retry_after)
+        try:
+            with self._running:
+                if self._executor_type is None:
+                    return func(*args, **kwargs)
+                executor = self._get_executor()
+                try:
+                    return executor.submit(func, *args, **kwargs).result()
+                except BrokenProcessPool:
+                    # A worker process died and the pool fails every operation
+                    # from now on, so the next operation starts a new pool
+                    self._discard_executor(executor)
+                    raise
+        finally:
+            self._admitted.release()
+
+    def shutdown(self) -> None:
+        with self._executor_lock:
+            if self._executor:
+                self._executor.shutdown()
+                self._executor = None
+
+    def _discard_executor(self, executor: Executor) -> None:
+        with self._executor_lock:
+            # Concurrent operations of the broken pool discard it only once
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False)
+
+    def _get_executor(self) -> Executor:
+        # Executors are started on first use, so that processes which never
+        # train do not pay for worker processes
+        with self._executor_lock:
+            if self._executor is None:
+                if self._executor_type == "process":
+                    # Worker processes are spawned, as forking a multi-threaded
+                    # server process is not safe
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.concurrency,
+                        mp_context=multiprocessing.get_context("spawn"),
+                    )
+                elif self._executor_type == "thread":
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.concurrency,
+                        thread_name_prefix=f"{self.operation}-pool",
+                    )
+                else:
+                    raise ValueError(f"Unsupported executor: {self._executor_type}")
+            return self._executor
@@ -0,0 +1,109 @@
+import dataclasses
+import math
+import threading
+from typing import Any, Dict, Iterable, List, Mapping, Optional
+
+from app.dtos import Applicant, ApplicantFields, DriftReport, FeatureDrift
+
+max_numeric_bins = 10
+
+
+class _FeatureBins:
+    def __init__(self, name: str, field: Any, offset: int) -> None:
+        self.name = name
+        self.offset = offset
+        self.categories: Optional[Dict[Any, int]] = None
+        if getattr(field, "enum", None):
+            # One bin per enum value plus one for anything else
+            self.categories = {value: i for i, value in enumerate(field.enum)}
+            self.size = len(field.enum) + 1
+        else:
+            # Fixed-width bins over the allowed range, values outside of it are
+            # counted in the first or last bin
+            self.minimum = field.minimum
+            self.width = math.ceil(
+                (field.maximum - field.minimum + 1) / max_numeric_bins
+            )
+            self.size = math.ceil((field.maximum - field.minimum + 1) / self.width)
+
+    def index(self, value: Any) -> int:
+        if self.categories is not None:
+            return self.offset + self.categories.get(value, self.size - 1)
+        i = int((value - self.minimum) // self.width)
+        return self.offset + min(max(i, 0), self.size - 1)
+
+
+class DriftMonitor:
+    """Constant-memory sketches of the distribution of the scored applicants.
+
+    Every applicant field has a fixed set of bins: one per enum value for
+    categorical fields and fixed-width histogram bins for numeric fields. Counts
+    are spread over a few shards, each with its own lock, so that concurrent
+    requests rarely wait on each other.
+    """
+
+    def __init__(self, num_shards: int = 16) -> None:
+        self._features: List[_FeatureBins] = []
+        size = 0
+        for field in dataclasses.fields(ApplicantFields):
+            self._features.append(_FeatureBins(field.name, field.default, size))
+            size += self._features[-1].size
+        self._shards = [[0] * size for _ in range(num_shards)]
+        self._samples = [0] * num_shards
+        self._locks = [threading.Lock() for _ in range(num_shards)]
+
+    def update(self, applicants: Iterable[Applicant]) -> None:
+        indices, samples = [], 0
+        for applicant in applicants:
+            indices.extend(f.index(getattr(applicant, f.name)) for f in self._features)
+            samples += 1
+
+        shard = threading.get_native_id() % len(self._shards)
+        with self._locks[shard]:
+            counts = self._shards[shard]
+            for i in indices:
+                counts[i] += 1
+            self._samples[shard] += samples
+
+    def reset(self) -> None:
+        for shard, lock in enumerate(self._locks):
+            with lock:
+                self._shards[shard] = [0] * len(self._shards[shard])
+                self._samples[shard] = 0
+
+    def report(self, reference: Mapping[str, Iterable[Any]]) -> DriftReport:
+        """Compares the scored applicants with reference values of every field."""
+        counts = [sum(shard_counts) for shard_counts in zip(*self._shards)]
+        samples = sum(self._samples)
+
+        features = []
+        for feature in self._features:
+            reference_counts = [0] * feature.size
+            for value in reference[feature.name]:
+                reference_counts[feature.index(value) - feature.offset] += 1
+            live_counts = counts[feature.offset : feature.offset + feature.size]
+            features.append(
+                FeatureDrift(
+                    feature=feature.name,
+                    divergence=_js_divergence(live_counts, reference_counts),
+                )
+            )
+        return DriftReport(samples=samples, features=features)
+
+
+def _js_divergence(p_counts: List[int], q_counts: List[int]) -> float:
+    p_total, q_total = sum(p_counts), sum(q_counts)
+    if not p_total or not q_total:
+        return 0.0
+    divergence = 0.0
+    for p_count, q_count in zip(p_counts, q_counts):
+        p, q = p_count / p_total, q_count / q_total
+        m = (p + q) / 2
+        if p:
+            divergence += p * math.log2(p / m) / 2
+        if q:
+            divergence += q * math.log2(q / m) / 2
+    return divergence
+
+
+drift_monitor = DriftMonitor()
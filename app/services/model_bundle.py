@@ -0,0 +1,92 @@
+import json
+import mmap
+import os
+from pathlib import Path
+from typing import List, Union
+
+# Bundle layout: magic, 8-byte little-endian header length, JSON index mapping
+# every packed file to its offset and size, then the contents of the files
+bundle_magic = b"SWEGBDL1"
+# Files of the data directory that make up the model registry
+bundle_files = {
+    "models": (".pkl", ".pkl.gz", ".txt"),
+    "encoders": (".pkl",),
+    "features": (".txt",),
+}
+
+
+class ModelBundle:
+    """Read-only, memory-mapped view of a model registry bundle."""
+
+    def __init__(self, path: Union[str, Path]) -> None:
+        self.path = Path(path)
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[: len(bundle_magic)] != bundle_magic:
+            raise ValueError(f"Not a model bundle: {path}")
+        header_start = len(bundle_magic) + 8
+        header_size = int.from_bytes(
+            self._mmap[len(bundle_magic) : header_start], "little"
+        )
+        self._index = json.loads(self._mmap[header_start : header_start + header_size])
+        self._data_start = header_start + header_size
+
+    def names(self) -> List[str]:
+        return list(self._index)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._index
+
+    def read(self, name: str) -> memoryview:
+        # Only the pages of the requested file are read from disk
+        offset, size = self._index[name]
+        start = self._data_start + offset
+        return memoryview(self._mmap)[start : start + size]
+
+
+def export_bundle(data_dir: Path, path: Union[str, Path]) -> int:
+    from data.preprocessor import atomic_write
+
+    files = {}
+    for directory, suffixes in bundle_files.items():
+        for filename in sorted(os.listdir(data_dir.joinpath(directory))):
+            if filename.startswith(".") or not filename.endswith(suffixes):
+                continue
+            try:
+                with open(data_dir.joinpath(directory, filename), "rb") as f:
+                    files[f"{directory}/{filename}"] = f.read()
+            except FileNotFoundError:
+                # Deleted since the directory was listed
+                continue
+    # Leave out the metadata of models whose pickle was deleted meanwhile, which
+    # may be compressed if the model is cold
+    for name in list(files):
+        if name.startswith("models/") and name.endswith(".txt"):
+            if not {f"{name[:-4]}.pkl", f"{name[:-4]}.pkl.gz"} & files.keys():
+                del files[name]
+
+    index, offset = {}, 0
+    for name, content in files.items():
+        index[name] = [offset, len(content)]
+        offset += len(content)
+    header = json.dumps(index).encode()
+    with atomic_write(path, "wb") as f:
+        f.write(bundle_magic)
+        f.write(len(header).to_bytes(8, "little"))
+        f.write(header)
+        for content in files.values():
+            f.write(content)
+    return len(files)
+
+
+def import_bundle(path: Union[str, Path], data_dir: Path) -> int:
+    from data.preprocessor import atomic_write
+
+    bundle = ModelBundle(path)
+    # Model pickles sort before their metadata, so they are published first
+    names = sorted(bundle.names())
+    for name in names:
+        data_dir.joinpath(name).parent.mkdir(parents=True, exist_ok=True)
+        with atomic_write(data_dir.joinpath(name), "wb") as f:
+            f.write(bundle.read(name))
+    return len(names)
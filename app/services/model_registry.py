@@ -0,0 +1,87 @@
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Optional, TypeVar, Union
+
+from app.services.model_bundle import ModelBundle
+from app.services.registry_watcher import RegistryWatcher
+
+T = TypeVar("T")
+
+
+class ModelRegistry:
+    """Bundle and in-memory cache of the model registry served by one app.
+
+    Loaded models, metadata and encoders are cached by their path in the data
+    directory, but only while they cannot change: when they are served from a
+    bundle, or while a watcher drops the entries of changed files. At most
+    ``max_size`` entries are kept, the least recently used are dropped first.
+    Every invalidation bumps the generation, so that a file which changes
+    while it is loaded is not cached.
+    """
+
+    def __init__(self, max_size: Optional[int] = None) -> None:
+        self.max_size = max_size
+        self.bundle: Optional[ModelBundle] = None
+        self._watcher: Optional[RegistryWatcher] = None
+        self._entries: "OrderedDict[str, Any]" = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    @property
+    def caching(self) -> bool:
+        return self.bundle is not None or self._watcher is not None
+
+    def use_bundle(self, path: Optional[Union[str, Path]]) -> None:
+        # Serve the models, encoders and ranked features of a bundle file instead
+        # of the data directory, or go back to the data directory with None
+        self.bundle = ModelBundle(path) if path else None
+        self.invalidate()
+
+    def watch(self, root: Path, interval: Optional[float]) -> None:
+        # Cache the files of the data directory and drop the entries of files
+        # changed by any process within interval seconds, or stop with None
+        self.close()
+        if interval is not None:
+            self._watcher = RegistryWatcher(
+                root,
+                ["models", "encoders"],
+                on_change=self.invalidate,
+                interval=interval,
+            )
+            self._watcher.start()
+
+    def close(self) -> None:
+        if self._watcher:
+            self._watcher.stop()
+            self._watcher = None
+        self.invalidate()
+
+    def invalidate(self, name: Optional[str] = None) -> None:
+        # Drop the cached contents of a file of the data directory, or of all
+        with self._lock:
+            self._generation += 1
+            if name is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(name, None)
+
+    def get(self, name: str, load: Callable[[], T]) -> T:
+        if not self.caching:
+            return load()
+        with self._lock:
+            if name in self._entries:
+                self._entries.move_to_end(name)
+                return self._entries[name]
+            generation = self._generation
+        value = load()
+        with self._lock:
+            # Missing files are not cached, so new models show up right away
+            if value is not None and generation == self._generation:
+                self._entries[name] = value
+                if self.max_size is not None and len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+        return value
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._entries
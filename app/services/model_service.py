@@ -1,101 +1,174 @@
+import io
+import logging
 import os
+import threading
+import time
 import uuid
 from dataclasses import asdict
 from pathlib import Path
 from statistics import mean
-from typing import List, Optional, Tuple
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple, Union
 
-import joblib
-import pandas as pd
-from sklearn.base import RegressorMixin
-from sklearn.linear_model import LinearRegression, LogisticRegression
-from sklearn.metrics import accuracy_score, r2_score
-from sklearn.model_selection import cross_val_score
+from flask import Flask, current_app, has_app_context
 
-from app.dtos import Applicant, ModelMetadata, PredictionResult, TrainResult
+from app.dtos import (Applicant, DriftReport, FeatureContribution,
+                      FeatureCurve, FeatureCurveMetadata, FeatureCurvePoint,
+                      ModelMetadata, ModelStorage, PredictionResult,
+                      StorageReport, StorageTier, TrainResult)
 from app.dtos.train import TrainMetadata
-from data.preprocessor import preprocess
+from app.services.drift_monitor import drift_monitor
+from app.services.model_registry import ModelRegistry
+from app.services.usage_tracker import usage_tracker
+
+# pandas, joblib and scikit-learn are imported where they are used, so that
+# processes which only list or look up models start without loading them
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+    from scipy.sparse import spmatrix
+    from sklearn.base import RegressorMixin
+
+logger = logging.getLogger(__name__)
 
 score_funcs = {
     "linear": ["f_regression", "mutual_info_regression"],
     "logistic": ["f_classif", "mutual_info_classif", "chi2"],
 }
 
-data_dir = Path().cwd().parent.joinpath("data")
+data_dir = Path(__file__).parents[2].joinpath("data")
+
+# Every app serves its own registry. Outside of apps, e.g. in scripts and training
+# worker processes, the data directory is served without caching.
+default_registry = ModelRegistry()
+
+# Models that have not been predicted with for a while are moved from the hot
+# tier of uncompressed pickles to the cold tier of compressed ones
+cold_suffix = ".pkl.gz"
+usage_filename = "model-usage.json"
+
+
+class CachedScoreFunc:
+    """Score function whose scores are cached on disk.
+
+    The cache is keyed by the score function and the data it scores, i.e. by the
+    fold, so trainings with a different number of features or model class reuse
+    the scores of earlier trainings on the same folds.
+    """
+
+    def __init__(self, score_func: str) -> None:
+        self.score_func = score_func
+
+    def __call__(self, X, y):
+        import sklearn.feature_selection
+        from joblib import Memory
+
+        memory = Memory(data_dir.joinpath("cache/feature-scores"), verbose=0)
+        return memory.cache(getattr(sklearn.feature_selection, self.score_func))(X, y)
 
 
 class ModelService:
     @staticmethod
-    def get_model(model_id: str) -> Optional[ModelMetadata]:
-        try:
-            f = open(f"{model_id}.txt", "r")
-        except FileNotFoundError:
-            return None
+    def registry() -> ModelRegistry:
+        if has_app_context():
+            return current_app.extensions["model_registry"]
+        return default_registry
 
-        data = f.readlines()
-        f.close()
-        return ModelMetadata(
-            model_id=model_id,
-            model_class=data[0].split(":")[1],
-            score_func=data[1].split(":")[1],
-            num_features=int(data[2].split(":")[1]),
-            k=int(data[3].split(":")[1]),
-            train_acc=float(data[4].split(":")[1]),
-            valid_acc=float(data[5].split(":")[1]),
-        )
+    @staticmethod
+    def invalidate(name: Optional[str] = None) -> None:
+        ModelService.registry().invalidate(name)
+
+    @staticmethod
+    def check_writable() -> None:
+        if ModelService.registry().bundle:
+            raise ValueError("Models cannot be changed while serving from a bundle")
+
+    @staticmethod
+    def get_model(model_id: str) -> Optional[ModelMetadata]:
+        return ModelService._load_model_metadata(model_id)
 
     @staticmethod
     def get_model_list() -> List[ModelMetadata]:
         model_list = []
-        for filename in os.listdir(data_dir.joinpath("models")):
+        bundle = ModelService.registry().bundle
+        if bundle:
+            filenames = [
+                name[7:] for name in bundle.names() if name.startswith("models/")
+            ]
+        else:
+            filenames = os.listdir(data_dir.joinpath("models"))
+        # Bundles and directories list their files in different orders
+        for filename in sorted(filenames):
             if not filename.endswith(".txt"):
                 continue
-            with open(filename, "r") as f:
-                data = f.readlines()
-            model_list.append(
-                ModelMetadata(
-                    model_id=filename[:-4],
-                    model_class=data[0].split(":")[1].strip(),
-                    score_func=data[1].split(":")[1].strip(),
-                    num_features=int(data[2].split(":")[1]),
-                    k=int(data[3].split(":")[1]),
-                    train_acc=float(data[4].split(":")[1]),
-                    valid_acc=float(data[5].split(":")[1]),
-                )
-            )
+            # The model may have been deleted since the directory was listed
+            model_metadata = ModelService._load_model_metadata(filename[:-4])
+            if model_metadata:
+                model_list.append(model_metadata)
         return model_list
 
     @staticmethod
     def delete(model_id: str) -> None:
-        # Delete model and its related metadata
-        try:
-            os.remove(f"models/{model_id}.txt")  # Delete model metadata
-            os.remove(f"models/{model_id}.pkl")  # Delete model
-        except OSError:
-            return None
+        ModelService.check_writable()
+        # Delete model and its related metadata. The metadata goes first so that
+        # the model is no longer listed before its pickle disappears.
+        for suffix in [".txt", ".pkl", cold_suffix]:
+            try:
+                os.remove(data_dir.joinpath(f"models/{model_id}{suffix}"))
+            except FileNotFoundError:
+                # Models are stored in either the hot or the cold tier
+                pass
+            ModelService.invalidate(f"models/{model_id}{suffix}")
 
     @staticmethod
-    def train(train_metadata: TrainMetadata) -> TrainResult:
+    def train(
+        train_metadata: TrainMetadata,
+        sparse: bool = False,
+        select_per_fold: bool = False,
+    ) -> TrainResult:
+        ModelService.check_writable()
+
+        from sklearn.feature_selection import SelectKBest
+        from sklearn.linear_model import LinearRegression, LogisticRegression
+        from sklearn.metrics import accuracy_score, r2_score
+        from sklearn.model_selection import cross_val_score
+        from sklearn.pipeline import Pipeline
+
         X, y = ModelService._prepare_dataset(
             train_metadata.model_class,
             train_metadata.score_func,
-            train_metadata.num_features,
+            # Selecting features per fold starts from all of them
+            None if select_per_fold else train_metadata.num_features,
+            sparse=sparse,
         )
 
-        model, train_accuracy = None, 0.0
+        model, accuracy_func = None, None
         if train_metadata.model_class == "linear":
-            model = LinearRegression().fit(X, y)
-            train_predicted = model.predict(X)
-            train_accuracy = r2_score(y, train_predicted)
+            model, accuracy_func = LinearRegression(), r2_score
         elif train_metadata.model_class == "logistic":
-            model = LogisticRegression(max_iter=1000).fit(X, y)
-            train_predicted = model.predict(X)
-            train_accuracy = accuracy_score(y, train_predicted)
+            model, accuracy_func = LogisticRegression(max_iter=1000), accuracy_score
+        if select_per_fold:
+            # Features are selected on the training part of every fold instead of
+            # from rankings computed on the whole dataset
+            model = Pipeline(
+                [
+                    (
+                        "select",
+                        SelectKBest(
+                            CachedScoreFunc(train_metadata.score_func),
+                            k=train_metadata.num_features,
+                        ),
+                    ),
+                    ("model", model),
+                ]
+            )
+        model.fit(X, y)
+        train_accuracy = accuracy_func(y, model.predict(X))
 
         model_id = str(uuid.uuid4())
         validation_accuracy = mean(cross_val_score(model, X, y, cv=train_metadata.k))
 
-        # Export the model
+        # Export the model before its metadata, so that every listed model can be
+        # loaded by concurrent readers
         ModelService._save_model(model_id, model)
         ModelService._save_model_metadata(
             ModelMetadata(
@@ -112,29 +185,376 @@ class ModelService:
             valid_acc=validation_accuracy,
         )
 
+    @staticmethod
+    def evaluate_feature_curve(curve_metadata: FeatureCurveMetadata) -> FeatureCurve:
+        import numpy as np
+        from sklearn.model_selection import check_cv
+
+        start = time.perf_counter()
+        ModelService._check_score_func(
+            curve_metadata.model_class, curve_metadata.score_func
+        )
+        features = ModelService._read_ranked_features(curve_metadata.score_func)
+        X = ModelService._load_dataset(features)[features].to_numpy(dtype=float)
+        y = ModelService._load_target(curve_metadata.model_class).to_numpy()
+
+        # Same folds as cross_val_score uses for the model class
+        cv = check_cv(
+            curve_metadata.k, y, classifier=curve_metadata.model_class == "logistic"
+        )
+        splits = list(cv.split(X, y))
+        prefix_scores = (
+            ModelService._linear_prefix_scores
+            if curve_metadata.model_class == "linear"
+            else ModelService._logistic_prefix_scores
+        )
+        train_scores = prefix_scores(X, y, np.arange(len(y)), np.arange(len(y)))
+        valid_scores = np.mean(
+            [prefix_scores(X, y, train, test) for train, test in splits], axis=0
+        )
+        points = [
+            FeatureCurvePoint(
+                num_features=i + 1,
+                train_acc=float(train_scores[i]),
+                valid_acc=float(valid_scores[i]),
+            )
+            for i in range(len(features))
+        ]
+        elapsed_time = time.perf_counter() - start
+
+        time_saved = None
+        if curve_metadata.compare:
+            time_saved = ModelService._time_separate_trainings(curve_metadata) - (
+                elapsed_time
+            )
+        return FeatureCurve(
+            points=points, elapsed_time=elapsed_time, time_saved=time_saved
+        )
+
     @staticmethod
     def predict(
-        model_id: str, model_metadata: ModelMetadata, applicant: Applicant
+        model_id: str,
+        model_metadata: ModelMetadata,
+        applicant: Applicant,
+        explain: bool = False,
     ) -> PredictionResult:
-        df = pd.DataFrame(asdict(applicant), index=[0])
+        return ModelService.predict_batch(
+            model_id, model_metadata, [applicant], explain=explain
+        )[0]
+
+    @staticmethod
+    def predict_batch(
+        model_id: str,
+        model_metadata: ModelMetadata,
+        applicants: List[Applicant],
+        explain: bool = False,
+    ) -> List[PredictionResult]:
+        if not applicants:
+            return []
+
+        import pandas as pd
+        from sklearn.pipeline import Pipeline
+
+        from data.preprocessor import preprocess
+
+        model = ModelService._load_model(model_id)
+        df = pd.DataFrame([asdict(applicant) for applicant in applicants])
         X, _ = ModelService._prepare_dataset(
             model_metadata.model_class,
             model_metadata.score_func,
-            model_metadata.num_features,
-            df=preprocess(df, predict=True),
+            # Pipelines select their features themselves
+            None if isinstance(model, Pipeline) else model_metadata.num_features,
+            df=preprocess(df, predict=True, encoders=ModelService._load_encoders()),
         )
-        model = joblib.load(data_dir.joinpath(f"models/{model_id}.pkl"))
-        out = model.predict(X)[0]
+        feature_names = list(X.columns)
+        if not hasattr(model, "feature_names_in_"):
+            # Models trained on sparse matrices were fitted without column names
+            X = X.to_numpy()
+        out = model.predict(X)
         if model_metadata.model_class == "linear":
             out = out >= 15.0
         elif model_metadata.model_class == "logistic":
-            out = bool(out)
-        return PredictionResult(model_id=model_id, success=out)
+            out = out.astype(bool)
+        drift_monitor.update(applicants)
+        # Bundles are read-only, so their usage is not kept
+        if usage_tracker.record(model_id, len(applicants)) and not (
+            ModelService.registry().bundle
+        ):
+            try:
+                usage_tracker.flush(data_dir.joinpath(usage_filename))
+            except OSError:
+                # A failed flush must not fail the prediction
+                logger.exception("Could not flush the model usage")
+        if not explain:
+            return [PredictionResult(model_id=model_id, success=bool(o)) for o in out]
+
+        features, intercept, contributions = ModelService._contributions(
+            model, X, feature_names
+        )
+        return [
+            PredictionResult(
+                model_id=model_id,
+                success=bool(o),
+                intercept=intercept,
+                contributions=[
+                    FeatureContribution(feature=feature, contribution=contribution)
+                    for feature, contribution in zip(features, row)
+                ],
+            )
+            for o, row in zip(out, contributions.tolist())
+        ]
+
+    @staticmethod
+    def _contributions(
+        model: Any, X: Union["pd.DataFrame", "np.ndarray"], feature_names: List[str]
+    ) -> Tuple[List[str], float, "np.ndarray"]:
+        # Coefficient times encoded value of every feature for the whole batch.
+        # With the intercept, these add up to the predicted final grade of linear
+        # models and to the log-odds of success of logistic models.
+        import numpy as np
+        from sklearn.pipeline import Pipeline
+
+        if isinstance(model, Pipeline):
+            # Only the features selected by the pipeline reach the model
+            feature_names = list(model[:-1].get_feature_names_out(feature_names))
+            X = model[:-1].transform(X)
+            model = model[-1]
+        X = np.asarray(X, dtype=float)
+        coef = np.ravel(model.coef_)
+        return feature_names, float(np.ravel(model.intercept_)[0]), X * coef
+
+    @staticmethod
+    def get_drift_report() -> DriftReport:
+        from data.preprocessor import inverse_preprocess
+
+        reference_df = inverse_preprocess(
+            ModelService._load_dataset(), encoders=ModelService._load_encoders()
+        )
+        return drift_monitor.report(reference_df)
+
+    @staticmethod
+    def compact_models(cold_after: float, keep: Optional[int] = None) -> StorageReport:
+        # Compress the models that have not been used for cold_after seconds and,
+        # if keep is given, delete all but the keep most recently used models
+        ModelService.check_writable()
+
+        import joblib
+
+        from data.preprocessor import atomic_write
+
+        usage = ModelService._flush_usage()
+        last_used = {}
+        for model_id in ModelService._list_model_ids():
+            try:
+                created = os.path.getmtime(data_dir.joinpath(f"models/{model_id}.txt"))
+            except FileNotFoundError:
+                continue
+            # Models that were never predicted with count as used when trained
+            last_used[model_id] = usage.get(model_id, (0, created))[1]
+
+        by_recency = sorted(last_used, key=last_used.get, reverse=True)
+        if keep is not None:
+            for model_id in by_recency[keep:]:
+                ModelService.delete(model_id)
+            by_recency = by_recency[:keep]
+
+        now = time.time()
+        for model_id in by_recency:
+            hot_path = data_dir.joinpath(f"models/{model_id}.pkl")
+            try:
+                # Models just promoted by other processes have a new pickle
+                promoted = os.path.getmtime(hot_path)
+                if now - max(last_used[model_id], promoted) < cold_after:
+                    continue
+                model = joblib.load(hot_path)
+            except FileNotFoundError:
+                continue
+            # The compressed copy is published before the uncompressed one is
+            # removed, so that one of them always exists
+            with atomic_write(
+                data_dir.joinpath(f"models/{model_id}{cold_suffix}"), "wb"
+            ) as f:
+                joblib.dump(model, f, compress=("gzip", 3))
+            os.remove(hot_path)
+            ModelService.invalidate(f"models/{model_id}.pkl")
+        return ModelService.get_storage_report()
+
+    @staticmethod
+    def get_storage_report() -> StorageReport:
+        from datetime import datetime
+
+        # Includes the predictions of this process that are not flushed yet
+        usage = ModelService._flush_usage()
+        models = []
+        for model_id in ModelService._list_model_ids():
+            for tier, suffix in [("hot", ".pkl"), ("cold", cold_suffix)]:
+                try:
+                    size = os.path.getsize(
+                        data_dir.joinpath(f"models/{model_id}{suffix}")
+                    )
+                except FileNotFoundError:
+                    continue
+                hits, last_predicted = usage.get(model_id, (0, None))
+                models.append(
+                    ModelStorage(
+                        model_id=model_id,
+                        tier=tier,
+                        size=size,
+                        hits=hits,
+                        last_predicted=datetime.fromtimestamp(last_predicted)
+                        if last_predicted
+                        else None,
+                    )
+                )
+                break
+        tiers = [
+            StorageTier(
+                tier=tier,
+                models=sum(1 for m in models if m.tier == tier),
+                size=sum(m.size for m in models if m.tier == tier),
+            )
+            for tier in ["hot", "cold"]
+        ]
+        return StorageReport(tiers=tiers, models=models)
+
+    @staticmethod
+    def schedule_compaction(
+        app: Flask, interval: float, cold_after: float, keep: Optional[int] = None
+    ) -> threading.Event:
+        # Compact the models of an app every interval seconds in a background
+        # thread, until the returned event is set
+        stopped = threading.Event()
+
+        def compact() -> None:
+            with app.app_context():
+                while not stopped.wait(interval):
+                    try:
+                        ModelService.compact_models(cold_after, keep)
+                    except Exception:
+                        logger.exception("Model compaction failed")
+
+        threading.Thread(target=compact, name="model-compaction", daemon=True).start()
+        return stopped
+
+    @staticmethod
+    def _linear_prefix_scores(
+        X: "np.ndarray", y: "np.ndarray", train: "np.ndarray", test: "np.ndarray"
+    ) -> "np.ndarray":
+        # Least squares for every prefix of the ranked features from one Gram
+        # matrix, growing its Cholesky factor by one feature at a time instead
+        # of solving every prefix from scratch
+        import numpy as np
+        from scipy.linalg import solve_triangular
+        from sklearn.metrics import r2_score
+
+        A = np.hstack([np.ones((len(X), 1)), X])
+        gram, moments = A[train].T @ A[train], A[train].T @ y[train]
+        L = np.zeros_like(gram)
+        z = np.zeros(len(gram))
+        active: List[int] = []
+        scores = []
+        for column in range(len(gram)):
+            n = len(active)
+            row = (
+                solve_triangular(L[:n, :n], gram[active, column], lower=True)
+                if n
+                else np.zeros(0)
+            )
+            pivot = gram[column, column] - row @ row
+            # Columns that are linear combinations of the previous ones, like the
+            # last category of a one-hot encoded field, do not change the fit
+            if pivot > 1e-10 * max(gram[column, column], 1.0):
+                L[n, :n], L[n, n] = row, np.sqrt(pivot)
+                z[n] = (moments[column] - row @ z[:n]) / L[n, n]
+                active.append(column)
+            if column == 0:
+                continue
+            n = len(active)
+            coef = solve_triangular(L[:n, :n].T, z[:n], lower=False)
+            scores.append(r2_score(y[test], A[np.ix_(test, active)] @ coef))
+        return np.array(scores)
+
+    @staticmethod
+    def _logistic_prefix_scores(
+        X: "np.ndarray", y: "np.ndarray", train: "np.ndarray", test: "np.ndarray"
+    ) -> "np.ndarray":
+        # Every prefix starts from the solution of the previous one, with a zero
+        # coefficient for the newly added feature
+        import numpy as np
+        from sklearn.linear_model import LogisticRegression
+        from sklearn.metrics import accuracy_score
+
+        model = LogisticRegression(max_iter=1000, warm_start=True)
+        scores = []
+        for num_features in range(1, X.shape[1] + 1):
+            if num_features > 1:
+                model.coef_ = np.hstack([model.coef_, np.zeros((1, 1))])
+            model.fit(X[np.ix_(train, range(num_features))], y[train])
+            scores.append(
+                accuracy_score(
+                    y[test], model.predict(X[np.ix_(test, range(num_features))])
+                )
+            )
+        return np.array(scores)
+
+    @staticmethod
+    def _time_separate_trainings(curve_metadata: FeatureCurveMetadata) -> float:
+        from sklearn.linear_model import LinearRegression, LogisticRegression
+        from sklearn.model_selection import cross_val_score
+
+        start = time.perf_counter()
+        num_features = len(
+            ModelService._read_ranked_features(curve_metadata.score_func)
+        )
+        for i in range(1, num_features + 1):
+            X, y = ModelService._prepare_dataset(
+                curve_metadata.model_class, curve_metadata.score_func, i
+            )
+            if curve_metadata.model_class == "linear":
+                model = LinearRegression()
+            else:
+                model = LogisticRegression(max_iter=1000)
+            model.fit(X, y).predict(X)
+            cross_val_score(model, X, y, cv=curve_metadata.k)
+        return time.perf_counter() - start
 
     @staticmethod
     def _prepare_dataset(
-        model_class: str, score_func: str, k: int, df: Optional[pd.DataFrame] = None
-    ) -> Tuple[pd.DataFrame, Optional[pd.Series]]:
+        model_class: str,
+        score_func: str,
+        k: Optional[int],
+        df: Optional["pd.DataFrame"] = None,
+        sparse: bool = False,
+    ) -> Tuple[Union["pd.DataFrame", "spmatrix"], Optional["pd.Series"]]:
+        ModelService._check_score_func(model_class, score_func)
+        features = ModelService._read_ranked_features(score_func)[:k]
+
+        if df is None and sparse:
+            import pandas as pd
+
+            from data.preprocessor import category_columns, preprocess_sparse
+
+            # The selected columns are encoded from the original dataset straight
+            # into a CSR matrix, without building the dense one-hot columns
+            columns = set(category_columns + features + ["G3"])
+            df = pd.read_csv(
+                data_dir.joinpath("student-mat.csv"),
+                sep=";",
+                usecols=lambda column: column in columns,
+            )
+            X, _ = preprocess_sparse(
+                df, features, encoders=ModelService._load_encoders()
+            )
+        else:
+            if df is None:
+                df = ModelService._load_dataset(features + ["G3"])
+            X = df.loc[:, df.columns.isin(features)]
+        if "G3" not in df.columns:
+            return X, None
+        return X, ModelService._target(model_class, df["G3"])
+
+    @staticmethod
+    def _check_score_func(model_class: str, score_func: str) -> None:
         if model_class not in score_funcs.keys():
             raise ValueError(f"Unsupported model class: {model_class}")
         if score_func not in score_funcs[model_class]:
@@ -142,33 +562,165 @@ class ModelService:
                 f"{model_class} model should use one of: {score_funcs[model_class]}"
             )
 
+    @staticmethod
+    def _load_target(model_class: str) -> "pd.Series":
+        # Reads only the final grades of the training dataset
+        return ModelService._target(
+            model_class, ModelService._load_dataset(["G3"])["G3"]
+        )
+
+    @staticmethod
+    def _target(model_class: str, grades: "pd.Series") -> "pd.Series":
+        # Linear models predict the final grade, logistic models its success
+        return grades if model_class == "linear" else grades >= 15.0
+
+    @staticmethod
+    def _read_ranked_features(score_func: str) -> List[str]:
+        bundle = ModelService.registry().bundle
+        if bundle:
+            content = bytes(bundle.read(f"features/ranked-features-{score_func}.txt"))
+            return [line.strip() for line in content.decode().splitlines()]
         with open(data_dir.joinpath(f"features/ranked-features-{score_func}.txt")) as f:
-            features = [line.strip() for line in f.readlines()][:k]
+            return [line.strip() for line in f.readlines()]
 
-        if df is None:
-            df = pd.read_csv(data_dir.joinpath("student-mat-preprocessed.csv"), sep=";")
-        X, y = df.loc[:, df.columns.isin(features)], None
-        if "G3" not in df.columns:
-            return X, y
-        if model_class == "linear":
-            y = df["G3"]
-        elif model_class == "logistic":
-            y = df["G3"] >= 15.0
-        return X, y
+    @staticmethod
+    def _load_pickle(name: str) -> Any:
+        import joblib
+
+        # Pickles are only unpickled from a bundle when first used
+        bundle = ModelService.registry().bundle
+        if bundle:
+            return joblib.load(io.BytesIO(bundle.read(name)))
+        return joblib.load(data_dir.joinpath(name))
+
+    @staticmethod
+    def _load_model(model_id: str) -> Any:
+        name = f"models/{model_id}.pkl"
+        return ModelService.registry().get(
+            name, lambda: ModelService._load_tiered(model_id)
+        )
+
+    @staticmethod
+    def _load_tiered(model_id: str) -> Any:
+        import joblib
+
+        from data.preprocessor import atomic_write
+
+        name = f"models/{model_id}.pkl"
+        bundle = ModelService.registry().bundle
+        if bundle:
+            return ModelService._load_pickle(
+                name if name in bundle else f"models/{model_id}{cold_suffix}"
+            )
+        try:
+            return joblib.load(data_dir.joinpath(name))
+        except FileNotFoundError:
+            pass
+        # Cold models are promoted back to the hot tier when they are used
+        model = joblib.load(data_dir.joinpath(f"models/{model_id}{cold_suffix}"))
+        with atomic_write(data_dir.joinpath(name), "wb") as f:
+            joblib.dump(model, f)
+        try:
+            os.remove(data_dir.joinpath(f"models/{model_id}{cold_suffix}"))
+        except FileNotFoundError:
+            # Promoted by another process at the same time
+            pass
+        return model
+
+    @staticmethod
+    def _load_encoders() -> Optional[Tuple[Any, Any]]:
+        # Encoders are loaded by the preprocessor unless they are cached
+        registry = ModelService.registry()
+        if not registry.caching:
+            return None
+        return tuple(
+            registry.get(name, lambda: ModelService._load_pickle(name))
+            for name in ["encoders/ordinal-encoder.pkl", "encoders/one-hot-encoder.pkl"]
+        )
+
+    @staticmethod
+    def _list_model_ids() -> List[str]:
+        return [
+            filename[:-4]
+            for filename in os.listdir(data_dir.joinpath("models"))
+            if filename.endswith(".txt") and not filename.startswith(".")
+        ]
+
+    @staticmethod
+    def _flush_usage() -> Dict[str, Tuple[int, float]]:
+        return usage_tracker.flush(
+            data_dir.joinpath(usage_filename), ModelService._list_model_ids()
+        )
+
+    @staticmethod
+    def _load_dataset(columns: Optional[List[str]] = None) -> "pd.DataFrame":
+        import pandas as pd
+
+        from data.preprocessor import read_columnar
+
+        # Prefer the memory-mapped columnar copy of the dataset, which only reads
+        # the requested columns, over parsing the whole CSV file
+        columnar_path = data_dir.joinpath("student-mat-preprocessed.bin")
+        if columnar_path.exists():
+            return read_columnar(columnar_path, columns)
+        return pd.read_csv(
+            data_dir.joinpath("student-mat-preprocessed.csv"), sep=";", usecols=columns
+        )
+
+    @staticmethod
+    def _load_model_metadata(model_id: str) -> Optional[ModelMetadata]:
+        return ModelService.registry().get(
+            f"models/{model_id}.txt",
+            lambda: ModelService._read_model_metadata(model_id),
+        )
+
+    @staticmethod
+    def _read_model_metadata(model_id: str) -> Optional[ModelMetadata]:
+        # Metadata files are published atomically, so a file that exists is
+        # always complete and can be read without any locking
+        bundle = ModelService.registry().bundle
+        if bundle:
+            if f"models/{model_id}.txt" not in bundle:
+                return None
+            data = bytes(bundle.read(f"models/{model_id}.txt")).decode().splitlines()
+        else:
+            try:
+                with open(data_dir.joinpath(f"models/{model_id}.txt"), "r") as f:
+                    data = f.readlines()
+            except FileNotFoundError:
+                return None
+
+        return ModelMetadata(
+            model_id=model_id,
+            model_class=data[0].split(":")[1].strip(),
+            score_func=data[1].split(":")[1].strip(),
+            num_features=int(data[2].split(":")[1]),
+            k=int(data[3].split(":")[1]),
+            train_acc=float(data[4].split(":")[1]),
+            valid_acc=float(data[5].split(":")[1]),
+        )
 
     @staticmethod
     def _save_model_metadata(model_metadata: ModelMetadata) -> None:
+        from data.preprocessor import atomic_write
+
         model_dir = data_dir.joinpath(f"models/{model_metadata.model_id}.txt")
-        with open(model_dir, "w") as f:
+        with atomic_write(model_dir) as f:
             f.write(f"Model Class:{model_metadata.model_class}\n")
             f.write(f"Score Function:{model_metadata.score_func}\n")
             f.write(f"Number of Features:{model_metadata.num_features}\n")
             f.write(f"K:{model_metadata.k}\n")
             f.write(f"Train Accuracy:{model_metadata.train_acc}\n")
             f.write(f"Validation Accuracy:{model_metadata.valid_acc}\n")
+        ModelService.invalidate(f"models/{model_metadata.model_id}.txt")
 
     @staticmethod
-    def _save_model(model_id: str, model: RegressorMixin) -> None:
+    def _save_model(model_id: str, model: "RegressorMixin") -> None:
+        import joblib
+
+        from data.preprocessor import atomic_write
+
         model_dir = data_dir.joinpath(f"models/{model_id}.pkl")
-        with open(model_dir, "w"):
-            joblib.dump(model, model_dir)
+        with atomic_write(model_dir, "wb") as f:
+            joblib.dump(model, f)
+        ModelService.invalidate(f"models/{model_id}.pkl")
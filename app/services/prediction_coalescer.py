@@ -0,0 +1,94 @@
+import threading
+from typing import Dict, List, Optional, Union
+
+from app.dtos import Applicant, ModelMetadata, PredictionResult
+from app.services.admission import AdmissionRejected, OperationPool
+from app.services.model_service import ModelService
+
+
+class _Batch:
+    def __init__(self, model_metadata: ModelMetadata) -> None:
+        self.model_metadata = model_metadata
+        self.applicants: List[Applicant] = []
+        self.results: List[Union[PredictionResult, Exception]] = []
+        self.full = threading.Event()
+        self.done = threading.Event()
+
+
+class PredictionCoalescer:
+    """Coalesces concurrent single predictions for the same model into batches.
+
+    The first request for a model opens a batch and waits until the batch is full
+    or the window has passed, then predicts the whole batch at once on behalf of
+    every request that joined it. If a pool is given, every batch is admitted
+    to it as one operation, so waiting requests do not hold its slots.
+    """
+
+    def __init__(
+        self, window: float, max_batch_size: int, pool: Optional[OperationPool] = None
+    ) -> None:
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self.pool = pool
+        self._lock = threading.Lock()
+        self._batches: Dict[str, _Batch] = {}
+
+    def predict(
+        self, model_id: str, model_metadata: ModelMetadata, applicant: Applicant
+    ) -> PredictionResult:
+        with self._lock:
+            batch: Optional[_Batch] = self._batches.get(model_id)
+            leader = batch is None
+            if leader:
+                batch = self._batches[model_id] = _Batch(model_metadata)
+            index = len(batch.applicants)
+            batch.applicants.append(applicant)
+            if len(batch.applicants) >= self.max_batch_size:
+                # Close the batch so that later requests open a new one
+                del self._batches[model_id]
+                batch.full.set()
+
+        if leader:
+            batch.full.wait(self.window)
+            with self._lock:
+                if self._batches.get(model_id) is batch:
+                    del self._batches[model_id]
+            try:
+                if self.pool:
+                    self.pool.run(self._run, model_id, batch)
+                else:
+                    self._run(model_id, batch)
+            except AdmissionRejected as e:
+                # Every request of a rejected batch is rejected
+                batch.results = [
+                    AdmissionRejected(e.operation, e.retry_after)
+                    for _ in batch.applicants
+                ]
+                batch.done.set()
+        else:
+            batch.done.wait()
+
+        result = batch.results[index]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    @staticmethod
+    def _run(model_id: str, batch: _Batch) -> None:
+        try:
+            batch.results = ModelService.predict_batch(
+                model_id, batch.model_metadata, batch.applicants
+            )
+        except Exception:
+            # Predict one by one so that an invalid applicant only fails its own
+            # request instead of the whole batch
+            batch.results = []
+            for applicant in batch.applicants:
+                try:
+                    batch.results.append(
+                        ModelService.predict(model_id, batch.model_metadata, applicant)
+                    )
+                except Exception as e:
+                    batch.results.append(e)
+        finally:
+            batch.done.set()
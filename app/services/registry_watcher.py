@@ -0,0 +1,159 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+# inotify(7) constants
+in_close_write = 0x00000008
+in_moved_from = 0x00000040
+in_moved_to = 0x00000080
+in_delete = 0x00000200
+in_q_overflow = 0x00004000
+in_nonblock = 0o4000
+in_cloexec = 0o2000000
+in_event = struct.Struct("iIII")
+
+
+def _load_inotify() -> Optional[ctypes.CDLL]:
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        libc.inotify_init1
+        libc.inotify_add_watch
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+class RegistryWatcher:
+    """Reports changes to the files of the watched directories.
+
+    ``on_change`` is called from a background thread with the path of every
+    changed file relative to ``root``, e.g. ``models/<model_id>.txt``, or with
+    ``None`` when changes may have been missed. Changes are read from inotify
+    where it is available, and otherwise found by comparing the modification
+    times of the files every ``interval`` seconds. Hidden files, such as the
+    temporary files of atomic writes, are ignored.
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        directories: Iterable[str],
+        on_change: Callable[[Optional[str]], None],
+        interval: float = 1.0,
+        use_inotify: bool = True,
+    ) -> None:
+        self.root = root
+        self.directories = list(directories)
+        self.on_change = on_change
+        self.interval = interval
+        self._libc = _load_inotify() if use_inotify else None
+        self._stopped = threading.Event()
+        # Written to on stop to wake up the thread waiting for inotify events
+        self._wakeup: Optional[Tuple[int, int]] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def uses_inotify(self) -> bool:
+        return self._libc is not None
+
+    def start(self) -> None:
+        fd = self._watch() if self._libc else None
+        if fd is None:
+            self._libc = None
+        else:
+            self._wakeup = os.pipe()
+        self._thread = threading.Thread(
+            target=self._read_events if fd is not None else self._poll,
+            args=(fd,) if fd is not None else (),
+            name="registry-watcher",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._wakeup:
+            os.write(self._wakeup[1], b"\0")
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        if self._wakeup:
+            os.close(self._wakeup[0])
+            os.close(self._wakeup[1])
+            self._wakeup = None
+
+    def _watch(self) -> Optional[int]:
+        fd = self._libc.inotify_init1(in_nonblock | in_cloexec)
+        if fd < 0:
+            return None
+        mask = in_close_write | in_moved_from | in_moved_to | in_delete
+        self._watches: Dict[int, str] = {}
+        for directory in self.directories:
+            path = os.fsencode(self.root.joinpath(directory))
+            wd = self._libc.inotify_add_watch(fd, path, mask)
+            if wd < 0:
+                # Missing directories are not watched
+                continue
+            self._watches[wd] = directory
+        if not self._watches:
+            os.close(fd)
+            return None
+        return fd
+
+    def _read_events(self, fd: int) -> None:
+        try:
+            while not self._stopped.is_set():
+                ready, _, _ = select.select([fd, self._wakeup[0]], [], [])
+                if fd not in ready:
+                    continue
+                try:
+                    buffer = os.read(fd, 64 * 1024)
+                except BlockingIOError:
+                    continue
+                offset = 0
+                while offset < len(buffer):
+                    wd, mask, _, size = in_event.unpack_from(buffer, offset)
+                    offset += in_event.size
+                    name = buffer[offset : offset + size].rstrip(b"\0")
+                    offset += size
+                    if mask & in_q_overflow:
+                        self.on_change(None)
+                    elif wd in self._watches and not name.startswith(b"."):
+                        self.on_change(f"{self._watches[wd]}/{os.fsdecode(name)}")
+        finally:
+            os.close(fd)
+
+    def _poll(self) -> None:
+        snapshot = self._snapshot()
+        while not self._stopped.wait(self.interval):
+            current = self._snapshot()
+            for name in snapshot.keys() | current.keys():
+                if snapshot.get(name) != current.get(name):
+                    self.on_change(name)
+            snapshot = current
+
+    def _snapshot(self) -> Dict[str, Tuple[int, int, int]]:
+        snapshot = {}
+        for directory in self.directories:
+            try:
+                entries = list(os.scandir(self.root.joinpath(directory)))
+            except FileNotFoundError:
+                continue
+            for entry in entries:
+                if entry.name.startswith("."):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                snapshot[f"{directory}/{entry.name}"] = (
+                    stat.st_mtime_ns,
+                    stat.st_size,
+                    stat.st_ino,
+                )
+        return snapshot
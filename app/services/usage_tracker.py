@@ -0,0 +1,93 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows, where concurrent flushes are not serialized
+    fcntl = None
+
+# Hits and last prediction time (seconds since the epoch) of a model
+Usage = Tuple[int, float]
+
+
+class UsageTracker:
+    """Counts the predictions of every model.
+
+    Predictions are counted in memory and added to a JSON file shared by all
+    processes when flushed, under an exclusive lock of the file so that the
+    counts of concurrent flushes are not lost. ``record`` tells one caller
+    every ``flush_interval`` seconds to flush the pending counts.
+    """
+
+    def __init__(self, flush_interval: float = 10.0) -> None:
+        self.flush_interval = flush_interval
+        self._pending: Dict[str, Usage] = {}
+        self._flushed_at = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, model_id: str, hits: int = 1) -> bool:
+        # Returns whether the caller should flush the pending counts now
+        now = time.time()
+        with self._lock:
+            pending_hits, _ = self._pending.get(model_id, (0, now))
+            self._pending[model_id] = (pending_hits + hits, now)
+            if now - self._flushed_at < self.flush_interval:
+                return False
+            self._flushed_at = now
+            return True
+
+    def flush(
+        self, path: Path, model_ids: Optional[Iterable[str]] = None
+    ) -> Dict[str, Usage]:
+        # Adds the pending counts to the file and returns the usage of all models,
+        # dropping models that are not in model_ids if given
+        from data.preprocessor import atomic_write
+
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._flushed_at = time.time()
+        with _locked(path):
+            usage = self.load(path)
+            changed = bool(pending)
+            for model_id, (hits, last_predicted) in pending.items():
+                total_hits, flushed_last = usage.get(model_id, (0, last_predicted))
+                usage[model_id] = (total_hits + hits, max(last_predicted, flushed_last))
+            if model_ids is not None:
+                model_ids = set(model_ids)
+                kept = {k: v for k, v in usage.items() if k in model_ids}
+                changed = changed or len(kept) < len(usage)
+                usage = kept
+            # The file is only rewritten if any count changed
+            if changed:
+                with atomic_write(path) as f:
+                    json.dump({k: list(v) for k, v in usage.items()}, f)
+        return usage
+
+    @staticmethod
+    def load(path: Path) -> Dict[str, Usage]:
+        try:
+            with open(path) as f:
+                return {k: (v[0], v[1]) for k, v in json.load(f).items()}
+        except FileNotFoundError:
+            return {}
+
+
+@contextmanager
+def _locked(path: Path) -> Iterator[None]:
+    if fcntl is None:
+        yield
+        return
+    with open(path.with_name(f".{path.name}.lock"), "a") as lock_file:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+usage_tracker = UsageTracker()
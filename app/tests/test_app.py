@@ -0,0 +1,107 @@
+import shutil
+import subprocess
+import sys
+import uuid
+from dataclasses import asdict
+from pathlib import Path
+from unittest.mock import patch
+
+from app.app import create_app
+from app.services import ModelService, PredictionCoalescer, model_service
+
+shipped_model_id = "20bf1dfd-291d-4b12-96a4-af29bf227780"
+
+
+class TestApp:
+    def test_create_app(self) -> None:
+        app = create_app()
+        assert app.extensions["prediction_coalescer"] is None
+        # The registry is only cached and watched if configured
+        assert not app.extensions["model_registry"].caching
+
+        app = create_app({"PREDICT_BATCH_WINDOW_MS": 2, "PREDICT_MAX_BATCH_SIZE": 8})
+        coalescer = app.extensions["prediction_coalescer"]
+        assert isinstance(coalescer, PredictionCoalescer)
+        assert coalescer.window == 0.002
+        assert coalescer.max_batch_size == 8
+
+    def test_models_cli(self, tmp_path: Path) -> None:
+        runner = create_app().test_cli_runner()
+        tmp_path.joinpath("models").mkdir()
+        with patch.object(model_service, "data_dir", tmp_path):
+            result = runner.invoke(args=["models", "compact", "--keep", "10"])
+            assert result.exit_code == 0
+            assert result.output == "hot: 0 models, 0 bytes\ncold: 0 models, 0 bytes\n"
+            result = runner.invoke(args=["models", "storage"])
+            assert result.output.startswith("hot: 0 models")
+
+    def test_deferred_imports(self) -> None:
+        # Listing models must not pull in the training and prediction stack
+        code = (
+            "import sys\n"
+            "from app.app import create_app\n"
+            "assert create_app().test_client().get('/api/models').status_code == 200\n"
+            "print(sorted({m.split('.')[0] for m in sys.modules}"
+            " & {'joblib', 'pandas', 'scipy', 'sklearn'}))"
+        )
+        out = subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=Path(__file__).parents[2],
+            capture_output=True,
+            check=True,
+            text=True,
+        )
+        assert out.stdout.strip() == "[]"
+
+    def test_model_bundle(self, tmp_path: Path) -> None:
+        data_dir = tmp_path / "data"
+        for directory in ["encoders", "features"]:
+            shutil.copytree(
+                model_service.data_dir.joinpath(directory), data_dir / directory
+            )
+        data_dir.joinpath("models").mkdir()
+        model_ids = sorted(str(uuid.uuid4()) for _ in range(3))
+        for model_id in model_ids:
+            for suffix in [".pkl", ".txt"]:
+                shutil.copy(
+                    model_service.data_dir.joinpath(
+                        f"models/{shipped_model_id}{suffix}"
+                    ),
+                    data_dir / f"models/{model_id}{suffix}",
+                )
+
+        bundle_path = tmp_path / "registry.bundle"
+        runner = create_app().test_cli_runner()
+        with patch.object(model_service, "data_dir", data_dir):
+            result = runner.invoke(args=["bundle", "export", str(bundle_path)])
+            assert result.exit_code == 0 and bundle_path.exists()
+            model_list = [asdict(model) for model in ModelService.get_model_list()]
+        # Models are listed in the same order from the directory and the bundle
+        assert [model["model_id"] for model in model_list] == model_ids
+
+        app = create_app({"MODEL_BUNDLE": bundle_path})
+        client = app.test_client()
+        assert client.get("/api/models").json == model_list
+        response = client.post(
+            "/api/models",
+            json={
+                "model_class": "logistic",
+                "score_func": "f_classif",
+                "num_features": 10,
+                "k": 3,
+            },
+        )
+        assert response.status_code == 400
+
+        # Every app serves its own registry
+        assert create_app().extensions["model_registry"].bundle is None
+        assert app.extensions["model_registry"].bundle.path == bundle_path
+
+        node_dir = tmp_path / "node"
+        with patch.object(model_service, "data_dir", node_dir):
+            result = runner.invoke(args=["bundle", "import", str(bundle_path)])
+        assert result.exit_code == 0
+        assert sorted(p.name for p in node_dir.joinpath("encoders").iterdir()) == [
+            "one-hot-encoder.pkl",
+            "ordinal-encoder.pkl",
+        ]
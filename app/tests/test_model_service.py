@@ -0,0 +1,616 @@
+import os
+import queue
+import shutil
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import asdict, fields, replace
+from pathlib import Path
+from typing import Generator, List, Optional
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.dtos import (Applicant, FeatureCurveMetadata, ModelMetadata,
+                      PredictionResult)
+from app.dtos.train import TrainMetadata
+from app.services import (AdmissionRejected, DriftMonitor, ModelBundle,
+                          ModelRegistry, ModelService, OperationPool,
+                          PredictionCoalescer, RegistryWatcher, model_service)
+from app.services.model_bundle import export_bundle, import_bundle
+from app.services.usage_tracker import UsageTracker
+from data.preprocessor import (atomic_write, preprocess, preprocess_sparse,
+                               read_columnar, write_columnar)
+
+source_data_dir = model_service.data_dir
+
+
+class TestModelService:
+    @pytest.fixture
+    def data_dir(self, tmp_path: Path) -> Generator[Path, None, None]:
+        for directory in ["encoders", "features"]:
+            shutil.copytree(source_data_dir.joinpath(directory), tmp_path / directory)
+        for filename in [
+            "student-mat.csv",
+            "student-mat-preprocessed.csv",
+            "student-mat-preprocessed.bin",
+        ]:
+            shutil.copy(source_data_dir.joinpath(filename), tmp_path)
+        tmp_path.joinpath("models").mkdir()
+        with patch.object(model_service, "data_dir", tmp_path):
+            yield tmp_path
+
+    def test_atomic_write(self, tmp_path: Path) -> None:
+        path = tmp_path / "artifact.txt"
+        with atomic_write(path) as f:
+            f.write("old")
+
+        # A failed write leaves the published file and no temporary files behind
+        with pytest.raises(RuntimeError):
+            with atomic_write(path) as f:
+                f.write("new")
+                raise RuntimeError
+        assert path.read_text() == "old"
+        assert os.listdir(tmp_path) == ["artifact.txt"]
+
+        # Published files get the same mode as files created by a plain open
+        reference = tmp_path / "reference.txt"
+        reference.write_text("")
+        assert path.stat().st_mode == reference.stat().st_mode
+
+    def test_train_and_list(self, data_dir: Path) -> None:
+        result = ModelService.train(
+            TrainMetadata(
+                model_class="logistic", score_func="f_classif", num_features=10, k=3
+            )
+        )
+        assert sorted(os.listdir(data_dir / "models")) == sorted(
+            [f"{result.model_id}.pkl", f"{result.model_id}.txt"]
+        )
+
+        # Temporary files of in-flight trainings are never listed
+        data_dir.joinpath("models", f".{uuid.uuid4()}.txt.abc.tmp").write_text("")
+        model_list = ModelService.get_model_list()
+        assert model_list == [
+            ModelMetadata(
+                model_id=result.model_id,
+                model_class="logistic",
+                score_func="f_classif",
+                num_features=10,
+                k=3,
+                train_acc=result.train_acc,
+                valid_acc=result.valid_acc,
+            )
+        ]
+        assert ModelService.get_model(result.model_id) == model_list[0]
+
+        ModelService.delete(result.model_id)
+        assert ModelService.get_model(result.model_id) is None
+        assert ModelService.get_model_list() == []
+
+    def test_predict_batch(self, data_dir: Path) -> None:
+        result = ModelService.train(
+            TrainMetadata(
+                model_class="logistic", score_func="f_classif", num_features=12, k=3
+            )
+        )
+        model_metadata = ModelService.get_model(result.model_id)
+        applicants = self._applicants()
+
+        results = ModelService.predict_batch(
+            result.model_id, model_metadata, applicants
+        )
+        assert results == [
+            ModelService.predict(result.model_id, model_metadata, applicant)
+            for applicant in applicants
+        ]
+        assert ModelService.predict_batch(result.model_id, model_metadata, []) == []
+
+    def test_train_select_per_fold(self, data_dir: Path) -> None:
+        def cached_scores() -> List[Path]:
+            return list(data_dir.joinpath("cache").glob("**/output.pkl"))
+
+        result = ModelService.train(
+            TrainMetadata(
+                model_class="logistic",
+                score_func="mutual_info_classif",
+                num_features=10,
+                k=3,
+            ),
+            select_per_fold=True,
+        )
+        # One set of scores for each fold and one for the final model
+        assert len(cached_scores()) == 4
+
+        # Scores are reused by a training with a different number of features
+        ModelService.train(
+            TrainMetadata(
+                model_class="logistic",
+                score_func="mutual_info_classif",
+                num_features=20,
+                k=3,
+            ),
+            select_per_fold=True,
+        )
+        assert len(cached_scores()) == 4
+
+        model_metadata = ModelService.get_model(result.model_id)
+        results = ModelService.predict_batch(
+            result.model_id, model_metadata, self._applicants()
+        )
+        assert len(results) == 20
+
+    @pytest.mark.parametrize(
+        "model_class,score_func,tolerance",
+        [("linear", "f_regression", 1e-6), ("logistic", "f_classif", 0.01)],
+    )
+    def test_evaluate_feature_curve(
+        self, data_dir: Path, model_class, score_func, tolerance
+    ) -> None:
+        curve = ModelService.evaluate_feature_curve(
+            FeatureCurveMetadata(model_class=model_class, score_func=score_func, k=4)
+        )
+        assert [p.num_features for p in curve.points] == list(range(1, 52))
+        assert curve.time_saved is None
+
+        # Matches training every number of features separately
+        for num_features in [1, 5, 10, 20]:
+            result = ModelService.train(
+                TrainMetadata(
+                    model_class=model_class,
+                    score_func=score_func,
+                    num_features=num_features,
+                    k=4,
+                )
+            )
+            point = curve.points[num_features - 1]
+            assert point.train_acc == pytest.approx(result.train_acc, abs=tolerance)
+            assert point.valid_acc == pytest.approx(result.valid_acc, abs=tolerance)
+
+    def test_drift_monitor(self) -> None:
+        monitor = DriftMonitor(num_shards=4)
+        applicants = self._applicants()
+        reference = pd.DataFrame([asdict(applicant) for applicant in applicants])
+
+        report = monitor.report(reference)
+        assert report.samples == 0
+        assert all(f.divergence == 0.0 for f in report.features)
+
+        # Applicants drawn like the reference do not diverge
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            list(executor.map(lambda a: monitor.update([a]), applicants))
+        report = monitor.report(reference)
+        assert report.samples == len(applicants)
+        assert [f.feature for f in report.features] == [
+            field.name for field in fields(Applicant)
+        ]
+        assert all(f.divergence == pytest.approx(0.0) for f in report.features)
+
+        # Only the shifted fields diverge, out of range values are still counted
+        monitor.update([replace(a, school="MS", absences=500) for a in applicants])
+        divergences = {
+            f.feature: f.divergence for f in monitor.report(reference).features
+        }
+        assert divergences["school"] > 0.1
+        assert divergences["absences"] > 0.1
+        assert divergences["age"] == pytest.approx(0.0)
+
+        monitor.reset()
+        assert monitor.report(reference).samples == 0
+
+    def test_drift_report(self, data_dir: Path) -> None:
+        result = ModelService.train(
+            TrainMetadata(
+                model_class="logistic", score_func="f_classif", num_features=12, k=3
+            )
+        )
+        model_metadata = ModelService.get_model(result.model_id)
+        samples = ModelService.get_drift_report().samples
+        ModelService.predict_batch(result.model_id, model_metadata, self._applicants())
+
+        report = ModelService.get_drift_report()
+        assert report.samples == samples + 20
+        assert len(report.features) == len(fields(Applicant))
+        assert all(0.0 <= f.divergence <= 1.0 for f in report.features)
+
+    def test_prediction_coalescer(self) -> None:
+        model_metadata = ModelMetadata(
+            model_id=str(uuid.uuid4()),
+            model_class="logistic",
+            score_func="f_classif",
+            num_features=12,
+            k=3,
+            train_acc=0.5,
+            valid_acc=0.5,
+        )
+        batch_sizes = []
+
+        def predict_batch(model_id, model_metadata, applicants):
+            batch_sizes.append(len(applicants))
+            return [
+                PredictionResult(model_id=model_id, success=applicant.age >= 18)
+                for applicant in applicants
+            ]
+
+        coalescer = PredictionCoalescer(window=0.5, max_batch_size=4)
+        applicants = self._applicants()[:8]
+        with patch.object(ModelService, "predict_batch", side_effect=predict_batch):
+            with ThreadPoolExecutor(max_workers=len(applicants)) as executor:
+                results = list(
+                    executor.map(
+                        lambda a: coalescer.predict(
+                            model_metadata.model_id, model_metadata, a
+                        ),
+                        applicants,
+                    )
+                )
+
+        # Every caller gets the result of its own applicant
+        assert [r.success for r in results] == [a.age >= 18 for a in applicants]
+        assert sorted(batch_sizes) == [4, 4]
+
+        # Batches are admitted as one operation, so they can grow past the
+        # concurrency of the pool, and are rejected as a whole
+        pool = OperationPool("predict", concurrency=1, queue_size=0, retry_after=3)
+        coalescer = PredictionCoalescer(window=0.5, max_batch_size=4, pool=pool)
+        batch_sizes.clear()
+        with patch.object(ModelService, "predict_batch", side_effect=predict_batch):
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                results = list(
+                    executor.map(
+                        lambda a: coalescer.predict(
+                            model_metadata.model_id, model_metadata, a
+                        ),
+                        applicants[:4],
+                    )
+                )
+                assert batch_sizes == [4]
+
+                started, release = threading.Event(), threading.Event()
+                busy = executor.submit(
+                    pool.run, lambda: started.set() or release.wait(5)
+                )
+                assert started.wait(5)
+                futures = [
+                    executor.submit(
+                        coalescer.predict, model_metadata.model_id, model_metadata, a
+                    )
+                    for a in applicants[:2]
+                ]
+                for future in futures:
+                    with pytest.raises(AdmissionRejected):
+                        future.result()
+                release.set()
+                busy.result()
+
+    def test_operation_pool(self) -> None:
+        pool = OperationPool("train", concurrency=1, queue_size=1, retry_after=3)
+        started, release = threading.Event(), threading.Event()
+
+        def work() -> int:
+            started.set()
+            release.wait(5)
+            return threading.get_ident()
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            running = executor.submit(pool.run, work)
+            assert started.wait(5)
+            queued = executor.submit(pool.run, threading.get_ident)
+
+            # One operation runs and one waits, so a third one is rejected
+            with pytest.raises(AdmissionRejected) as e:
+                pool.run(threading.get_ident)
+            assert e.value.retry_after == 3
+
+            release.set()
+            running.result(), queued.result()
+        assert pool.run(threading.get_ident) == threading.get_ident()
+
+        # Operations of pools with an executor run in that executor
+        pool = OperationPool(
+            "train", concurrency=1, queue_size=0, retry_after=3, executor="process"
+        )
+        try:
+            assert pool.run(os.getpid) != os.getpid()
+
+            # A pool whose worker died is replaced by the next operation
+            with pytest.raises(BrokenProcessPool):
+                pool.run(os._exit, 1)
+            assert pool.run(os.getpid) != os.getpid()
+        finally:
+            pool.shutdown()
+
+    @staticmethod
+    def _applicants() -> List[Applicant]:
+        df = pd.read_csv(source_data_dir.joinpath("student-mat.csv"), sep=";")
+        df = df.drop(columns=["G1", "G2", "G3"]).head(20)
+        return [Applicant(**row) for row in df.to_dict(orient="records")]
+
+    @pytest.mark.parametrize(
+        "model_class,score_func",
+        [("linear", "f_regression"), ("logistic", "chi2")],
+    )
+    def test_train_sparse(self, data_dir: Path, model_class, score_func) -> None:
+        train_metadata = TrainMetadata(
+            model_class=model_class, score_func=score_func, num_features=20, k=3
+        )
+        dense = ModelService.train(train_metadata)
+        sparse = ModelService.train(train_metadata, sparse=True)
+        assert sparse.train_acc == pytest.approx(dense.train_acc, abs=1e-6)
+        assert sparse.valid_acc == pytest.approx(dense.valid_acc, abs=1e-6)
+
+    def test_preprocess_sparse(self) -> None:
+        df = pd.read_csv(source_data_dir.joinpath("student-mat.csv"), sep=";")
+        dense = preprocess(df, predict=True)
+        columns = ["school_1.0", "mother_job_2.0", "age", "absences"]
+        X, names = preprocess_sparse(df, columns)
+        assert names == [column for column in dense.columns if column in columns]
+        assert X.format == "csr"
+        np.testing.assert_array_equal(X.toarray(), dense[names].to_numpy(dtype=float))
+
+    def test_columnar_dataset(self, data_dir: Path) -> None:
+        df = pd.read_csv(data_dir / "student-mat-preprocessed.csv", sep=";")
+        write_columnar(df, data_dir / "dataset.bin")
+
+        columnar_df = read_columnar(data_dir / "dataset.bin")
+        assert list(columnar_df.columns) == list(df.columns)
+        assert (columnar_df.dtypes == np.uint8).all()
+        np.testing.assert_array_equal(columnar_df.to_numpy(), df.to_numpy())
+
+        # Columns keep the dataset order regardless of the requested order
+        columnar_df = read_columnar(data_dir / "dataset.bin", ["G3", "age"])
+        assert list(columnar_df.columns) == ["age", "G3"]
+        pd.testing.assert_frame_equal(columnar_df, df[["age", "G3"]], check_dtype=False)
+
+        # Training gives the same results with or without the columnar copy
+        train_metadata = TrainMetadata(
+            model_class="linear", score_func="f_regression", num_features=15, k=4
+        )
+        columnar = ModelService.train(train_metadata)
+        os.remove(data_dir / "student-mat-preprocessed.bin")
+        csv = ModelService.train(train_metadata)
+        assert columnar.train_acc == pytest.approx(csv.train_acc)
+        assert columnar.valid_acc == pytest.approx(csv.valid_acc)
+
+    def test_model_bundle(self, data_dir: Path, tmp_path_factory) -> None:
+        result = ModelService.train(
+            TrainMetadata(
+                model_class="logistic", score_func="f_classif", num_features=12, k=3
+            )
+        )
+        model_metadata = ModelService.get_model(result.model_id)
+        applicants = self._applicants()
+        expected = ModelService.predict_batch(
+            result.model_id, model_metadata, applicants
+        )
+        # Metadata without a pickle is left out of the bundle
+        data_dir.joinpath("models", f"{uuid.uuid4()}.txt").write_text("")
+
+        bundle_path = data_dir / "registry.bundle"
+        assert export_bundle(data_dir, bundle_path) == 9
+        bundle = ModelBundle(bundle_path)
+        assert f"models/{result.model_id}.pkl" in bundle
+        assert bytes(bundle.read("features/ranked-features-f_classif.txt")) == (
+            data_dir.joinpath("features/ranked-features-f_classif.txt").read_bytes()
+        )
+
+        registry = ModelRegistry()
+        registry.use_bundle(bundle_path)
+        with patch.object(model_service, "default_registry", registry):
+            assert ModelService.get_model_list() == [model_metadata]
+            assert (
+                ModelService.predict_batch(result.model_id, model_metadata, applicants)
+                == expected
+            )
+            with pytest.raises(ValueError):
+                ModelService.delete(result.model_id)
+
+        node_dir = tmp_path_factory.mktemp("node")
+        assert import_bundle(bundle_path, node_dir) == 9
+        for name in bundle.names():
+            assert node_dir.joinpath(name).read_bytes() == bytes(bundle.read(name))
+
+    @pytest.mark.parametrize("use_inotify", [True, False])
+    def test_registry_watcher(self, tmp_path: Path, use_inotify: bool) -> None:
+        tmp_path.joinpath("models").mkdir()
+        changes: "queue.Queue[Optional[str]]" = queue.Queue()
+        watcher = RegistryWatcher(
+            tmp_path,
+            ["models", "encoders"],
+            on_change=changes.put,
+            interval=0.05,
+            use_inotify=use_inotify,
+        )
+        watcher.start()
+        try:
+            assert watcher.uses_inotify == use_inotify
+            with atomic_write(tmp_path / "models/model.txt") as f:
+                f.write("metadata")
+            assert changes.get(timeout=5) == "models/model.txt"
+            os.remove(tmp_path / "models/model.txt")
+            assert changes.get(timeout=5) == "models/model.txt"
+        finally:
+            watcher.stop()
+        # Temporary files of the atomic write are not reported
+        assert changes.empty()
+
+    def test_registry_cache(self, data_dir: Path) -> None:
+        result = ModelService.train(
+            TrainMetadata(
+                model_class="logistic", score_func="f_classif", num_features=10, k=3
+            )
+        )
+        registry = ModelRegistry()
+        registry.watch(data_dir, 0.05)
+        try:
+            with patch.object(model_service, "default_registry", registry):
+                model_metadata = ModelService.get_model(result.model_id)
+                assert ModelService.get_model(result.model_id) is model_metadata
+                ModelService.predict(
+                    result.model_id, model_metadata, self._applicants()[0]
+                )
+                assert f"models/{result.model_id}.pkl" in registry
+
+                # Deleting the model in another process drops it from the cache
+                subprocess.run(
+                    [
+                        sys.executable,
+                        "-c",
+                        "import sys\n"
+                        "from app.services import ModelService, model_service\n"
+                        "from pathlib import Path\n"
+                        "model_service.data_dir = Path(sys.argv[1])\n"
+                        "ModelService.delete(sys.argv[2])",
+                        str(data_dir),
+                        result.model_id,
+                    ],
+                    cwd=source_data_dir.parent,
+                    check=True,
+                )
+                deadline = time.monotonic() + 5
+                while ModelService.get_model(result.model_id) and (
+                    time.monotonic() < deadline
+                ):
+                    time.sleep(0.01)
+                assert ModelService.get_model(result.model_id) is None
+                assert f"models/{result.model_id}.pkl" not in registry
+        finally:
+            registry.close()
+
+        # Only the most recently used entries are kept
+        registry = ModelRegistry(max_size=2)
+        registry.watch(data_dir, 60)
+        try:
+            for name in ["a", "b", "a", "c"]:
+                registry.get(name, lambda: name.upper())
+            assert "a" in registry and "c" in registry and "b" not in registry
+        finally:
+            registry.close()
+
+    def test_usage_tracker(self, tmp_path: Path) -> None:
+        path = tmp_path / "model-usage.json"
+        tracker = UsageTracker(flush_interval=60)
+        # One record every flush_interval seconds is told to flush
+        assert tracker.record("a", 2)
+        assert not tracker.record("a", 3)
+        assert not tracker.record("b")
+        tracker.flush(path)
+        usage = UsageTracker.load(path)
+        assert {model_id: hits for model_id, (hits, _) in usage.items()} == {
+            "a": 5,
+            "b": 1,
+        }
+
+        # Counts of other trackers are added, and deleted models are dropped
+        other = UsageTracker()
+        other.record("a")
+        other.flush(path, ["a"])
+        usage = UsageTracker.load(path)
+        assert list(usage) == ["a"] and usage["a"][0] == 6
+
+    def test_model_tiers(self, data_dir: Path) -> None:
+        train_metadata = TrainMetadata(
+            model_class="logistic", score_func="f_classif", num_features=10, k=3
+        )
+        model_ids = [ModelService.train(train_metadata).model_id for _ in range(3)]
+        applicants = self._applicants()
+        expected = ModelService.predict_batch(
+            model_ids[0], ModelService.get_model(model_ids[0]), applicants
+        )
+        # Storage reports include the predictions that were not flushed yet, and
+        # other processes read them from the usage file
+        report = ModelService.get_storage_report()
+        assert {m.model_id: m.hits for m in report.models}[model_ids[0]] == len(
+            applicants
+        )
+        usage = UsageTracker.load(data_dir / "model-usage.json")
+        assert usage[model_ids[0]][0] == len(applicants)
+        # The other models were trained a day ago and never predicted with
+        day_ago = time.time() - 24 * 60 * 60
+        for i, model_id in enumerate(model_ids):
+            for suffix in [".pkl", ".txt"]:
+                os.utime(data_dir / f"models/{model_id}{suffix}", (day_ago + i,) * 2)
+
+        report = ModelService.compact_models(cold_after=60 * 60)
+        tiers = {m.model_id: m.tier for m in report.models}
+        assert tiers == {
+            model_ids[0]: "hot",
+            model_ids[1]: "cold",
+            model_ids[2]: "cold",
+        }
+        assert not data_dir.joinpath(f"models/{model_ids[1]}.pkl").exists()
+        hot, cold = report.tiers
+        assert (hot.tier, hot.models, cold.tier, cold.models) == ("hot", 1, "cold", 2)
+        # Every cold model takes less space than the hot one
+        assert cold.size < 2 * hot.size
+        usage = {m.model_id: m for m in report.models}
+        assert usage[model_ids[0]].hits == len(applicants)
+        assert usage[model_ids[0]].last_predicted is not None
+        assert usage[model_ids[1]].hits == 0
+
+        # Cold models are listed and promoted back to the hot tier when used
+        assert len(ModelService.get_model_list()) == 3
+        model_metadata = ModelService.get_model(model_ids[2])
+        results = ModelService.predict_batch(model_ids[2], model_metadata, applicants)
+        assert [r.success for r in results] == [r.success for r in expected]
+        assert data_dir.joinpath(f"models/{model_ids[2]}.pkl").exists()
+        assert not data_dir.joinpath(f"models/{model_ids[2]}.pkl.gz").exists()
+
+        # Only the two most recently used models are kept
+        report = ModelService.compact_models(cold_after=60 * 60, keep=2)
+        assert {m.model_id for m in report.models} == {model_ids[0], model_ids[2]}
+        assert ModelService.get_model(model_ids[1]) is None
+        assert sorted(os.listdir(data_dir / "models")) == sorted(
+            f"{model_id}{suffix}"
+            for model_id in [model_ids[0], model_ids[2]]
+            for suffix in [".pkl", ".txt"]
+        )
+
+    @pytest.mark.parametrize(
+        "model_class,score_func,select_per_fold",
+        [
+            ("linear", "f_regression", False),
+            ("logistic", "f_classif", False),
+            ("logistic", "chi2", True),
+        ],
+    )
+    def test_predict_explain(
+        self, data_dir: Path, model_class, score_func, select_per_fold
+    ) -> None:
+        result = ModelService.train(
+            TrainMetadata(
+                model_class=model_class, score_func=score_func, num_features=12, k=3
+            ),
+            select_per_fold=select_per_fold,
+        )
+        model_metadata = ModelService.get_model(result.model_id)
+        applicants = self._applicants()
+
+        explained = ModelService.predict_batch(
+            result.model_id, model_metadata, applicants, explain=True
+        )
+        plain = ModelService.predict_batch(result.model_id, model_metadata, applicants)
+        assert [r.success for r in explained] == [r.success for r in plain]
+        assert all(r.contributions is None for r in plain)
+
+        # Contributions of the selected features add up to the model output
+        model = ModelService._load_model(result.model_id)
+        df = preprocess(pd.DataFrame([asdict(a) for a in applicants]), predict=True)
+        if model_class == "linear":
+            scores = model.predict(df[model.feature_names_in_])
+        else:
+            scores = model.decision_function(df[model.feature_names_in_])
+        for r, score in zip(explained, scores):
+            assert len(r.contributions) == 12
+            total = r.intercept + sum(c.contribution for c in r.contributions)
+            assert total == pytest.approx(score)
+        if not select_per_fold:
+            assert [c.feature for c in explained[0].contributions] == list(
+                model.feature_names_in_
+            )
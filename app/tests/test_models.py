@@ -1,14 +1,24 @@
+import gzip
 import random
+import threading
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import asdict
-from typing import Any, Dict, Generator, List
+from datetime import datetime
+from typing import Any, Dict, Generator, List, Tuple
 from unittest.mock import patch
 
 import pytest
 from flask.testing import FlaskClient
+from werkzeug.exceptions import HTTPException
 
-from app.app import app
-from app.dtos import ModelMetadata, PredictionResult, TrainResult
+from app.app import create_app
+from app.dtos import (Applicant, DriftReport, FeatureContribution,
+                      FeatureCurve, FeatureCurveMetadata, FeatureCurvePoint,
+                      FeatureDrift, ModelMetadata, ModelStorage,
+                      PredictionResult, StorageReport, StorageTier,
+                      TrainResult)
+from app.handlers.models import applicant_model, applicant_validator
 from app.services import ModelService
 from app.services.model_service import score_funcs
 
@@ -16,6 +26,8 @@ from app.services.model_service import score_funcs
 class TestModels:
     @pytest.fixture
     def client(self) -> Generator[FlaskClient, None, None]:
+        # Patched services cannot be sent to training worker processes
+        app = create_app({"TRAIN_EXECUTOR": "thread"})
         with app.test_client() as client:
             yield client
 
@@ -91,6 +103,51 @@ class TestModels:
             assert len(data) == len(three_models)
             assert all(m1 == asdict(m2) for m1, m2 in zip(data, three_models))
 
+    def test_get_model_list_msgpack(self, client: FlaskClient, three_models) -> None:
+        msgpack = pytest.importorskip("msgpack")
+        url = "/api/models"
+
+        with patch.object(ModelService, "get_model_list", return_value=three_models):
+            resp = client.get(url, headers={"Accept": "application/msgpack"})
+            assert resp.status_code == 200
+            assert resp.content_type == "application/msgpack"
+            assert msgpack.unpackb(resp.data) == [asdict(m) for m in three_models]
+
+        # Large responses are compressed for clients that accept gzip
+        many_models = three_models * 100
+        with patch.object(ModelService, "get_model_list", return_value=many_models):
+            resp = client.get(
+                url,
+                headers={"Accept": "application/msgpack", "Accept-Encoding": "gzip"},
+            )
+            assert resp.headers["Content-Encoding"] == "gzip"
+            data = msgpack.unpackb(gzip.decompress(resp.data))
+            assert data == [asdict(m) for m in many_models]
+
+    def test_get_model_list_arrow(self, client: FlaskClient, three_models) -> None:
+        pa = pytest.importorskip("pyarrow")
+
+        with patch.object(ModelService, "get_model_list", return_value=three_models):
+            resp = client.get(
+                "/api/models",
+                headers={"Accept": "application/vnd.apache.arrow.stream"},
+            )
+            assert resp.status_code == 200
+            table = pa.ipc.open_stream(resp.data).read_all()
+            assert table.to_pylist() == [asdict(m) for m in three_models]
+
+    def test_get_model_list_json(self, client: FlaskClient, three_models) -> None:
+        # JSON is used unless a binary encoding is preferred
+        with patch.object(ModelService, "get_model_list", return_value=three_models):
+            for accept in [None, "*/*", "application/json, application/msgpack;q=0.5"]:
+                resp = client.get(
+                    "/api/models", headers={"Accept": accept} if accept else {}
+                )
+                assert resp.status_code == 200
+                assert resp.content_type == "application/json"
+                assert resp.headers["Vary"] == "Accept"
+                assert resp.get_json() == [asdict(m) for m in three_models]
+
     def test_create_model(self, client: FlaskClient) -> None:
         url = "/api/models"
 
@@ -148,6 +205,129 @@ class TestModels:
         )
         assert resp.status_code == 400
 
+    def test_feature_curve(self, client: FlaskClient) -> None:
+        url = "/api/models/curve"
+
+        curve = FeatureCurve(
+            points=[
+                FeatureCurvePoint(num_features=1, train_acc=0.5, valid_acc=0.4),
+                FeatureCurvePoint(num_features=2, train_acc=0.6, valid_acc=0.5),
+            ],
+            elapsed_time=0.1,
+            time_saved=0.5,
+        )
+        with patch.object(
+            ModelService, "evaluate_feature_curve", return_value=curve
+        ) as evaluate_feature_curve:
+            resp = client.post(
+                url,
+                json={
+                    "model_class": "logistic",
+                    "score_func": "f_classif",
+                    "k": 5,
+                    "compare": True,
+                },
+            )
+            data = resp.get_json()
+            assert resp.status_code == 200
+            assert evaluate_feature_curve.call_args.args[0] == FeatureCurveMetadata(
+                model_class="logistic", score_func="f_classif", k=5, compare=True
+            )
+            assert data == asdict(curve)
+
+            # Flags sent as strings are parsed as booleans
+            for compare in ["false", "0"]:
+                resp = client.post(
+                    f"{url}?compare={compare}",
+                    json={"model_class": "logistic", "score_func": "f_classif", "k": 5},
+                )
+                assert resp.status_code == 200
+                assert not evaluate_feature_curve.call_args.args[0].compare
+
+        # Invalid FeatureCurveMetadata input
+        resp = client.post(url, json={"model_class": "RandomForest", "k": 1})
+        assert resp.status_code == 400
+
+    def test_feature_curve_process(self) -> None:
+        # Training operations run in worker processes by default
+        app = create_app()
+        url = "/api/models/curve"
+        try:
+            with app.test_client() as client:
+                resp = client.post(
+                    url,
+                    json={"model_class": "logistic", "score_func": "f_classif", "k": 5},
+                )
+                data = resp.get_json()
+                assert resp.status_code == 200
+                assert [point["num_features"] for point in data["points"]] == list(
+                    range(1, len(data["points"]) + 1)
+                )
+                assert all(0 <= point["valid_acc"] <= 1 for point in data["points"])
+
+                # Errors raised in the worker process are still invalid input
+                resp = client.post(
+                    url,
+                    json={
+                        "model_class": "logistic",
+                        "score_func": "f_regression",
+                        "k": 5,
+                    },
+                )
+                assert resp.status_code == 400
+        finally:
+            app.extensions["operation_pools"]["train"].shutdown()
+
+    def test_drift_report(self, client: FlaskClient) -> None:
+        report = DriftReport(
+            samples=10,
+            features=[
+                FeatureDrift(feature="school", divergence=0.5),
+                FeatureDrift(feature="age", divergence=0.0),
+            ],
+        )
+        with patch.object(ModelService, "get_drift_report", return_value=report):
+            resp = client.get("/api/models/drift")
+            data = resp.get_json()
+            assert resp.status_code == 200
+            assert data == asdict(report)
+
+    def test_storage_report(self, client: FlaskClient) -> None:
+        model_id = str(uuid.uuid4())
+        report = StorageReport(
+            tiers=[
+                StorageTier(tier="hot", models=0, size=0),
+                StorageTier(tier="cold", models=1, size=972),
+            ],
+            models=[
+                ModelStorage(
+                    model_id=model_id,
+                    tier="cold",
+                    size=972,
+                    hits=3,
+                    last_predicted=datetime(2022, 11, 9, 12, 30),
+                )
+            ],
+        )
+        with patch.object(ModelService, "get_storage_report", return_value=report):
+            resp = client.get("/api/models/storage")
+        assert resp.status_code == 200
+        assert resp.get_json() == {
+            "tiers": [
+                {"tier": "hot", "models": 0, "size": 0},
+                {"tier": "cold", "models": 1, "size": 972},
+            ],
+            "models": [
+                {
+                    "model_id": model_id,
+                    "tier": "cold",
+                    "size": 972,
+                    "hits": 3,
+                    "last_predicted": "2022-11-09T12:30:00",
+                }
+            ],
+        }
+
     def test_get_model(self, client: FlaskClient) -> None:
         url = "/api/models/{}"
 
@@ -267,3 +447,260 @@ class TestModels:
                 assert resp.status_code == 200
                 assert data["model_id"] == model_id
                 assert not data["success"]
+
+    def test_predict_explain(self, client: FlaskClient, applicant) -> None:
+        model_id = str(uuid.uuid4())
+        model_metadata = ModelMetadata(
+            model_id=model_id,
+            train_acc=0.5,
+            valid_acc=0.5,
+            model_class="logistic",
+            score_func="f_classif",
+            num_features=2,
+            k=5,
+        )
+        result = PredictionResult(
+            model_id=model_id,
+            success=True,
+            intercept=-1.5,
+            contributions=[
+                FeatureContribution(feature="failures", contribution=-0.5),
+                FeatureContribution(feature="mother_edu_4.0", contribution=2.5),
+            ],
+        )
+        with patch.object(ModelService, "get_model", return_value=model_metadata):
+            with patch.object(ModelService, "predict", return_value=result) as predict:
+                resp = client.post(
+                    f"/api/models/{model_id}/predict?explain=true", json=applicant
+                )
+                assert predict.call_args.kwargs == {"explain": True}
+            assert resp.status_code == 200
+            assert resp.get_json() == {
+                "model_id": model_id,
+                "success": True,
+                "intercept": -1.5,
+                "contributions": [
+                    {"feature": "failures", "contribution": -0.5},
+                    {"feature": "mother_edu_4.0", "contribution": 2.5},
+                ],
+            }
+
+            with patch.object(
+                ModelService, "predict_batch", return_value=[result]
+            ) as predict_batch:
+                resp = client.post(
+                    f"/api/models/{model_id}/predict/batch?explain=1", json=[applicant]
+                )
+                assert predict_batch.call_args.kwargs == {"explain": True}
+            assert resp.get_json()[0]["contributions"][1]["contribution"] == 2.5
+
+            resp = client.post(
+                f"/api/models/{model_id}/predict?explain=maybe", json=applicant
+            )
+            assert resp.status_code == 400
+
+    @pytest.fixture
+    def batch_results(self) -> Tuple[ModelMetadata, List[PredictionResult]]:
+        # One explained and one plain result per applicant
+        model_id = str(uuid.uuid4())
+        model_metadata = ModelMetadata(
+            model_id=model_id,
+            train_acc=0.5,
+            valid_acc=0.5,
+            model_class="logistic",
+            score_func="f_classif",
+            num_features=2,
+            k=5,
+        )
+        explained = PredictionResult(
+            model_id=model_id,
+            success=True,
+            intercept=-1.5,
+            contributions=[
+                FeatureContribution(feature="failures", contribution=-0.5),
+                FeatureContribution(feature="mother_edu_4.0", contribution=2.5),
+            ],
+        )
+        plain = PredictionResult(model_id=model_id, success=False)
+        return model_metadata, [explained, plain]
+
+    def test_predict_batch_msgpack(
+        self, client: FlaskClient, applicant, batch_results
+    ) -> None:
+        msgpack = pytest.importorskip("msgpack")
+        model_metadata, (explained, plain) = batch_results
+        url = f"/api/models/{model_metadata.model_id}/predict/batch"
+
+        with patch.object(ModelService, "get_model", return_value=model_metadata):
+            with patch.object(ModelService, "predict_batch", return_value=[explained]):
+                resp = client.post(
+                    f"{url}?explain=1",
+                    json=[applicant],
+                    headers={"Accept": "application/msgpack"},
+                )
+            assert resp.status_code == 200
+            assert resp.content_type == "application/msgpack"
+            assert msgpack.unpackb(resp.data) == [asdict(explained)]
+
+            # Missing explanations are left out, as in JSON
+            with patch.object(ModelService, "predict_batch", return_value=[plain]):
+                resp = client.post(
+                    url, json=[applicant], headers={"Accept": "application/msgpack"}
+                )
+            assert msgpack.unpackb(resp.data) == [
+                {"model_id": model_metadata.model_id, "success": False}
+            ]
+
+    def test_predict_batch_arrow(
+        self, client: FlaskClient, applicant, batch_results
+    ) -> None:
+        pa = pytest.importorskip("pyarrow")
+        model_metadata, (explained, plain) = batch_results
+        url = f"/api/models/{model_metadata.model_id}/predict/batch"
+        headers = {"Accept": "application/vnd.apache.arrow.stream"}
+
+        with patch.object(ModelService, "get_model", return_value=model_metadata):
+            with patch.object(
+                ModelService, "predict_batch", return_value=[explained, plain]
+            ):
+                resp = client.post(
+                    f"{url}?explain=1", json=[applicant] * 2, headers=headers
+                )
+            assert resp.status_code == 200
+            assert resp.content_type == "application/vnd.apache.arrow.stream"
+            table = pa.ipc.open_stream(resp.data).read_all()
+            assert table.column_names == [
+                "model_id",
+                "success",
+                "intercept",
+                "contributions",
+            ]
+            # Contributions are a list of structs, and missing values are null
+            assert table.to_pylist() == [asdict(explained), asdict(plain)]
+
+            with patch.object(ModelService, "predict_batch", return_value=[plain]):
+                resp = client.post(url, json=[applicant], headers=headers)
+            assert pa.ipc.open_stream(resp.data).read_all().to_pylist() == [
+                {
+                    "model_id": model_metadata.model_id,
+                    "success": False,
+                    "intercept": None,
+                    "contributions": None,
+                }
+            ]
+
+    def test_applicant_validation(self, applicant) -> None:
+        invalid_payloads = [
+            {**applicant, "age": 40},
+            {**applicant, "age": 14},
+            {**applicant, "age": "18"},
+            {**applicant, "age": 18.5},
+            {**applicant, "health": True},
+            {**applicant, "school": "XX"},
+            {**applicant, "sex": None},
+            {**applicant, "school": "XX", "sex": 3, "absences": -1},
+            {key: value for key, value in applicant.items() if key != "reason"},
+            {},
+            [applicant],
+            "applicant",
+        ]
+        # Same errors as the JSON schema validation of Flask-RESTX
+        for payload in invalid_payloads:
+            with pytest.raises(HTTPException) as expected:
+                applicant_model.validate(payload)
+            with pytest.raises(HTTPException) as actual:
+                applicant_validator.parse(payload)
+            assert actual.value.data == expected.value.data
+
+        assert applicant_validator.parse(applicant) == Applicant(**applicant)
+        assert applicant_validator.parse_list(applicant) == [Applicant(**applicant)]
+
+    def test_predict_batch(self, client: FlaskClient, applicant) -> None:
+        url = "/api/models/{}/predict/batch"
+
+        # Model ID must be an UUID
+        resp = client.post(url.format("abcd"), json=[applicant])
+        assert resp.status_code == 400
+
+        # Every applicant is validated
+        model_id = str(uuid.uuid4())
+        resp = client.post(url.format(model_id), json=[applicant, {"age": 40}])
+        assert resp.status_code == 400
+
+        # Model must exist
+        with patch.object(ModelService, "get_model", return_value=None):
+            resp = client.post(url.format(model_id), json=[applicant])
+            assert resp.status_code == 404
+
+        # Lists of more than PREDICT_MAX_APPLICANTS are rejected before prediction
+        client.application.config["PREDICT_MAX_APPLICANTS"] = 2
+        with patch.object(ModelService, "predict_batch") as predict_batch:
+            resp = client.post(url.format(model_id), json=[applicant] * 3)
+        assert resp.status_code == 413
+        assert not predict_batch.called
+
+        # Returns desired data
+        model_metadata = ModelMetadata(
+            model_id=model_id,
+            train_acc=0.5,
+            valid_acc=0.5,
+            model_class="logistic",
+            score_func="f_classif",
+            num_features=25,
+            k=5,
+        )
+        with patch.object(ModelService, "get_model", return_value=model_metadata):
+            with patch.object(
+                ModelService,
+                "predict_batch",
+                return_value=[
+                    PredictionResult(model_id=model_id, success=True),
+                    PredictionResult(model_id=model_id, success=False),
+                ],
+            ) as predict_batch:
+                resp = client.post(url.format(model_id), json=[applicant, applicant])
+            data = resp.get_json()
+            assert resp.status_code == 200
+            assert len(predict_batch.call_args.args[2]) == 2
+            assert data == [
+                {"model_id": model_id, "success": True},
+                {"model_id": model_id, "success": False},
+            ]
+
+    def test_admission_control(self, applicant) -> None:
+        app = create_app(
+            {"TRAIN_EXECUTOR": "thread", "TRAIN_QUEUE_SIZE": 0, "RETRY_AFTER": 7}
+        )
+        model_id = str(uuid.uuid4())
+        started, release = threading.Event(), threading.Event()
+
+        def train(*args, **kwargs) -> TrainResult:
+            started.set()
+            release.wait(5)
+            return TrainResult(model_id=model_id, train_acc=0.5, valid_acc=0.5)
+
+        train_metadata = {
+            "model_class": "logistic",
+            "score_func": "f_classif",
+            "num_features": 10,
+            "k": 2,
+        }
+        with patch.object(ModelService, "train", side_effect=train):
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                running = executor.submit(
+                    app.test_client().post, "/api/models", json=train_metadata
+                )
+                assert started.wait(5)
+
+                # The train pool is full, so training is rejected right away
+                resp = app.test_client().post("/api/models", json=train_metadata)
+                assert resp.status_code == 429
+                assert resp.headers["Retry-After"] == "7"
+
+                # Other operations have their own pools
+                with patch.object(ModelService, "get_model_list", return_value=[]):
+                    resp = app.test_client().get("/api/models")
+                    assert resp.status_code == 200
+
+                release.set()
+                assert running.result().status_code == 201
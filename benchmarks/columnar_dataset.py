@@ -0,0 +1,56 @@
+"""Compares loading the preprocessed dataset from CSV and from the columnar copy.
+
+Run from the repository root with ``python -m benchmarks.columnar_dataset``.
+"""
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Tuple
+
+import pandas as pd
+
+from data.preprocessor import read_columnar
+
+data_dir = Path(__file__).parents[1].joinpath("data")
+csv_path = data_dir.joinpath("student-mat-preprocessed.csv")
+columnar_path = data_dir.joinpath("student-mat-preprocessed.bin")
+repeat = 200
+
+
+def measure(load: Callable[[], pd.DataFrame]) -> Tuple[float, float, float]:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        load()
+    elapsed = (time.perf_counter() - start) / repeat
+
+    tracemalloc.start()
+    df = load()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed * 1000, peak / 2**10, df.memory_usage(deep=True).sum() / 2**10
+
+
+def run() -> None:
+    with open(data_dir.joinpath("features/ranked-features-f_classif.txt")) as f:
+        features = [line.strip() for line in f.readlines()][:12] + ["G3"]
+
+    cases = {
+        "csv, all columns": lambda: pd.read_csv(csv_path, sep=";"),
+        "csv, selected columns": lambda: pd.read_csv(
+            csv_path, sep=";", usecols=features
+        ),
+        "columnar, all columns": lambda: read_columnar(columnar_path),
+        "columnar, selected columns": lambda: read_columnar(columnar_path, features),
+    }
+    print(
+        f"file sizes: csv {csv_path.stat().st_size / 2**10:.1f} KiB, "
+        f"columnar {columnar_path.stat().st_size / 2**10:.1f} KiB"
+    )
+    print(f"{'case':>26} {'load (ms)':>10} {'peak (KiB)':>11} {'frame (KiB)':>12}")
+    for name, load in cases.items():
+        elapsed, peak, size = measure(load)
+        print(f"{name:>26} {elapsed:>10.3f} {peak:>11.1f} {size:>12.1f}")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,32 @@
+"""Compares evaluating every number of features in one pass with separate trainings.
+
+Run from the repository root with ``python -m benchmarks.feature_curve``.
+"""
+from app.dtos import FeatureCurveMetadata
+from app.services import ModelService
+from app.services.model_service import score_funcs
+
+k = 5
+
+
+def run() -> None:
+    print(f"{k}-fold cross validation for every number of features")
+    print(
+        f"{'model class':>11} {'score function':>22} {'one pass (s)':>12} {'separate (s)':>12}"
+    )
+    for model_class, funcs in score_funcs.items():
+        for score_func in funcs:
+            curve = ModelService.evaluate_feature_curve(
+                FeatureCurveMetadata(
+                    model_class=model_class, score_func=score_func, k=k, compare=True
+                )
+            )
+            separate = curve.elapsed_time + curve.time_saved
+            print(
+                f"{model_class:>11} {score_func:>22} "
+                f"{curve.elapsed_time:>12.2f} {separate:>12.2f}"
+            )
+
+
+if __name__ == "__main__":
+    run()
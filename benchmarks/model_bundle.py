@@ -0,0 +1,94 @@
+"""Compares bootstrapping a serving node from a registry bundle with copying the
+loose files of the data directory, for a registry with many models.
+
+Run from the repository root with ``python -m benchmarks.model_bundle``.
+"""
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+from app.services.model_bundle import export_bundle
+
+root_dir = Path(__file__).parents[1]
+data_dir = root_dir.joinpath("data")
+num_models = 2000
+model_id = "20bf1dfd-291d-4b12-96a4-af29bf227780"
+first_prediction = (
+    "import sys\n"
+    "from app.app import create_app\n"
+    "from app.services import model_service\n"
+    "from pathlib import Path\n"
+    "model_service.data_dir = Path(sys.argv[1])\n"
+    "app = create_app({'MODEL_BUNDLE': sys.argv[2] or None})\n"
+    "client = app.test_client()\n"
+    "assert len(client.get('/api/models').get_json()) == %d\n"
+    "resp = client.post('/api/models/%s/predict', json=%s)\n"
+    "assert resp.status_code == 200, resp.get_json()\n"
+)
+
+
+def make_registry(registry_dir: Path) -> None:
+    # Copies of the shipped model under new IDs stand in for a large registry
+    for directory in ["encoders", "features"]:
+        shutil.copytree(data_dir.joinpath(directory), registry_dir / directory)
+    shutil.copy(data_dir / "student-mat-preprocessed.bin", registry_dir)
+    models_dir = registry_dir / "models"
+    models_dir.mkdir()
+    model = data_dir.joinpath(f"models/{model_id}.pkl").read_bytes()
+    metadata = data_dir.joinpath(f"models/{model_id}.txt").read_text()
+    for i in range(num_models):
+        new_id = model_id if i == 0 else str(uuid.uuid4())
+        models_dir.joinpath(f"{new_id}.pkl").write_bytes(model)
+        models_dir.joinpath(f"{new_id}.txt").write_text(
+            metadata.replace(model_id, new_id)
+        )
+
+
+def bootstrap(node_dir: Path, bundle: str) -> float:
+    from benchmarks.startup import applicant
+
+    start = time.perf_counter()
+    code = first_prediction % (num_models, model_id, applicant)
+    subprocess.run(
+        [sys.executable, "-c", code, str(node_dir), bundle], cwd=root_dir, check=True
+    )
+    return (time.perf_counter() - start) * 1000
+
+
+def run() -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp_dir = Path(tmp)
+        registry_dir = tmp_dir / "registry"
+        make_registry(registry_dir)
+        bundle_path = tmp_dir / "registry.bundle"
+        start = time.perf_counter()
+        export_bundle(registry_dir, bundle_path)
+        export_time = (time.perf_counter() - start) * 1000
+
+        # Loose files: copy the whole directory tree to the node, then serve it
+        start = time.perf_counter()
+        shutil.copytree(registry_dir, tmp_dir / "loose")
+        loose_copy = (time.perf_counter() - start) * 1000
+        loose_start = bootstrap(tmp_dir / "loose", "")
+
+        # Bundle: copy a single file next to the dataset, then serve from it
+        node_dir = tmp_dir / "bundled"
+        node_dir.mkdir()
+        start = time.perf_counter()
+        shutil.copy(bundle_path, node_dir)
+        bundle_copy = (time.perf_counter() - start) * 1000
+        shutil.copy(registry_dir / "student-mat-preprocessed.bin", node_dir)
+        bundle_start = bootstrap(node_dir, str(node_dir / "registry.bundle"))
+
+    print(f"{num_models} models, bundle exported in {export_time:.0f} ms")
+    print(f"{'registry':>8} {'copy (ms)':>10} {'first prediction (ms)':>22}")
+    print(f"{'loose':>8} {loose_copy:>10.0f} {loose_start:>22.0f}")
+    print(f"{'bundle':>8} {bundle_copy:>10.0f} {bundle_start:>22.0f}")
+
+
+if __name__ == "__main__":
+    run()
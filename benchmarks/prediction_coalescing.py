@@ -0,0 +1,65 @@
+"""Compares concurrent single predictions with and without request coalescing.
+
+Run from the repository root with ``python -m benchmarks.prediction_coalescing``.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from statistics import quantiles
+from typing import Callable, List, Tuple
+
+import pandas as pd
+
+from app.dtos import Applicant
+from app.services import ModelService, PredictionCoalescer
+
+data_dir = Path(__file__).parents[1].joinpath("data")
+model_id = "20bf1dfd-291d-4b12-96a4-af29bf227780"
+num_clients = 32
+num_requests = 1024
+
+
+def run_clients(
+    predict: Callable, applicants: List[Applicant]
+) -> Tuple[float, float, float]:
+    model_metadata = ModelService.get_model(model_id)
+    latencies = []
+
+    def request(applicant: Applicant) -> None:
+        start = time.perf_counter()
+        predict(model_id, model_metadata, applicant)
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=num_clients) as executor:
+        list(executor.map(request, applicants))
+    elapsed = time.perf_counter() - start
+
+    percentiles = quantiles(latencies, n=100)
+    return (
+        num_requests / elapsed,
+        percentiles[49] * 1000,
+        percentiles[98] * 1000,
+    )
+
+
+def run() -> None:
+    df = pd.read_csv(data_dir.joinpath("student-mat.csv"), sep=";")
+    df = df.drop(columns=["G1", "G2", "G3"])
+    records = df.to_dict(orient="records")
+    applicants = [Applicant(**records[i % len(records)]) for i in range(num_requests)]
+
+    cases = {"no coalescing": ModelService.predict}
+    for window_ms in (1, 2, 5):
+        coalescer = PredictionCoalescer(window=window_ms / 1000, max_batch_size=32)
+        cases[f"{window_ms} ms window"] = coalescer.predict
+
+    print(f"{num_clients} concurrent clients, {num_requests} requests")
+    print(f"{'case':>14} {'req/s':>8} {'p50 (ms)':>9} {'p99 (ms)':>9}")
+    for name, predict in cases.items():
+        throughput, p50, p99 = run_clients(predict, applicants)
+        print(f"{name:>14} {throughput:>8.0f} {p50:>9.2f} {p99:>9.2f}")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,45 @@
+"""Compares batch predictions with and without per-feature contributions.
+
+Run from the repository root with ``python -m benchmarks.prediction_explain``.
+"""
+import timeit
+from pathlib import Path
+
+import pandas as pd
+
+from app.dtos import Applicant
+from app.services import ModelService
+
+data_dir = Path(__file__).parents[1].joinpath("data")
+model_id = "20bf1dfd-291d-4b12-96a4-af29bf227780"
+repeat = 5
+
+
+def run() -> None:
+    model_metadata = ModelService.get_model(model_id)
+    df = pd.read_csv(data_dir.joinpath("student-mat.csv"), sep=";")
+    df = df.drop(columns=["G1", "G2", "G3"])
+    print(f"{'batch size':>10} {'plain (ms)':>11} {'explained (ms)':>15}")
+    for batch_size in [1, 32, 395]:
+        applicants = [
+            Applicant(**record)
+            for record in df.head(batch_size).to_dict(orient="records")
+        ]
+        times = []
+        for explain in [False, True]:
+            number = 20
+            seconds = min(
+                timeit.repeat(
+                    lambda: ModelService.predict_batch(
+                        model_id, model_metadata, applicants, explain=explain
+                    ),
+                    number=number,
+                    repeat=repeat,
+                )
+            )
+            times.append(seconds / number * 1000)
+        print(f"{batch_size:>10} {times[0]:>11.2f} {times[1]:>15.2f}")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,63 @@
+"""Compares the time and size of large model list responses in every encoding.
+
+Binary encodings are only measured if msgpack or pyarrow is installed.
+Run from the repository root with ``python -m benchmarks.response_encodings``.
+"""
+import random
+import time
+import uuid
+from statistics import median
+from unittest.mock import patch
+
+from app.app import create_app
+from app.dtos import ModelMetadata
+from app.handlers.encodings import available_media_types, json_type
+from app.services import ModelService
+
+num_models = 10000
+repeat = 5
+
+
+def make_models() -> list:
+    return [
+        ModelMetadata(
+            model_id=str(uuid.uuid4()),
+            model_class="logistic",
+            score_func=random.choice(["f_classif", "mutual_info_classif", "chi2"]),
+            num_features=random.randint(1, 40),
+            k=random.randint(2, 10),
+            train_acc=random.random(),
+            valid_acc=random.random(),
+        )
+        for _ in range(num_models)
+    ]
+
+
+def run() -> None:
+    client = create_app().test_client()
+    print(f"{num_models} models, median of {repeat} requests")
+    print(f"{'encoding':>36} {'gzip':>5} {'time (ms)':>10} {'size (KiB)':>11}")
+    with patch.object(ModelService, "get_model_list", return_value=make_models()):
+        for media_type in available_media_types():
+            # JSON responses are never compressed by the service
+            encodings = (
+                ["identity"] if media_type == json_type else ["identity", "gzip"]
+            )
+            for encoding in encodings:
+                times = []
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    resp = client.get(
+                        "/api/models",
+                        headers={"Accept": media_type, "Accept-Encoding": encoding},
+                    )
+                    times.append(time.perf_counter() - start)
+                gzipped = resp.headers.get("Content-Encoding") == "gzip"
+                print(
+                    f"{media_type:>36} {'yes' if gzipped else 'no':>5}"
+                    f" {median(times) * 1000:>10.1f} {len(resp.data) / 1024:>11.1f}"
+                )
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,138 @@
+"""Compares the dense and sparse training paths of the service on the real dataset.
+
+The applicants of ``data/student-mat.csv`` are repeated to grow the dataset, and
+``_prepare_dataset`` and ``train`` are timed for both paths on a copy of the data
+directory. The ``school`` column is then replaced by synthetic categories of growing
+cardinality, and ``preprocess`` and ``preprocess_sparse`` are timed on encoders fitted
+to them. Run from the repository root with ``python -m benchmarks.sparse_one_hot``.
+"""
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, List, Tuple
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+
+from app.dtos.train import TrainMetadata
+from app.services import ModelService, model_service
+from data.preprocessor import (category_columns, preprocess, preprocess_sparse,
+                               write_columnar)
+
+source_data_dir = Path(__file__).parents[1].joinpath("data")
+model_class, score_func = "logistic", "f_classif"
+
+
+def make_data_dir(path: Path, repeat: int) -> None:
+    shutil.copytree(source_data_dir.joinpath("features"), path / "features")
+    path.joinpath("models").mkdir()
+    df = pd.read_csv(source_data_dir.joinpath("student-mat.csv"), sep=";")
+    df = pd.concat([df] * repeat, ignore_index=True)
+    df.to_csv(path / "student-mat.csv", sep=";", index=False)
+    preprocessed_df = preprocess(df, predict=True)
+    preprocessed_df.to_csv(path / "student-mat-preprocessed.csv", sep=";", index=False)
+    write_columnar(preprocessed_df, path / "student-mat-preprocessed.bin")
+
+
+def measure(func: Callable[[], Any]) -> Tuple[float, float]:
+    # Best time of three runs and the peak of Python allocations of one more
+    elapsed = min(_time(func) for _ in range(3))
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / 2**20
+
+
+def _time(func: Callable[[], Any]) -> float:
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def run(repeats: List[int]) -> None:
+    num_features = len(ModelService._read_ranked_features(score_func))
+    train_metadata = TrainMetadata(
+        model_class=model_class,
+        score_func=score_func,
+        num_features=num_features,
+        k=3,
+    )
+    print(f"{model_class} model, {num_features} features")
+    print(
+        f"{'rows':>7} {'mode':>6} {'X (MiB)':>8} {'prepare (ms)':>12} "
+        f"{'peak (MiB)':>10} {'train (s)':>9} {'peak (MiB)':>10}"
+    )
+    for repeat in repeats:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            make_data_dir(Path(tmp_dir), repeat)
+            with patch.object(model_service, "data_dir", Path(tmp_dir)):
+                for sparse in (False, True):
+
+                    def prepare() -> Any:
+                        return ModelService._prepare_dataset(
+                            model_class, score_func, num_features, sparse=sparse
+                        )[0]
+
+                    X = prepare()
+                    # Size of the matrix as it is fitted by the model
+                    size = (
+                        X.data.nbytes + X.indices.nbytes + X.indptr.nbytes
+                        if sparse
+                        else X.shape[0] * X.shape[1] * 8
+                    )
+                    prepare_time, prepare_peak = measure(prepare)
+                    train_time, train_peak = measure(
+                        lambda: ModelService.train(train_metadata, sparse=sparse)
+                    )
+                    print(
+                        f"{X.shape[0]:>7} {'sparse' if sparse else 'dense':>6} "
+                        f"{size / 2**20:>8.2f} {prepare_time * 1000:>12.1f} "
+                        f"{prepare_peak:>10.2f} {train_time:>9.3f} {train_peak:>10.2f}"
+                    )
+
+
+def run_cardinality(cardinalities: List[int], repeat: int = 10) -> None:
+    from sklearn.preprocessing import OneHotEncoder, OrdinalEncoder
+
+    df = pd.read_csv(source_data_dir.joinpath("student-mat.csv"), sep=";")
+    df = pd.concat([df] * repeat, ignore_index=True)
+    rng = np.random.default_rng(0)
+    print(f"\n{len(df)} applicants, school of growing cardinality")
+    print(
+        f"{'values':>7} {'columns':>7} {'mode':>6} {'X (MiB)':>8} "
+        f"{'encode (ms)':>11} {'peak (MiB)':>10}"
+    )
+    for cardinality in cardinalities:
+        df["school"] = [f"S{i}" for i in rng.integers(cardinality, size=len(df))]
+        oe = OrdinalEncoder().fit(df[category_columns])
+        ohe = OneHotEncoder(drop="if_binary", sparse=False)
+        ohe.fit(oe.transform(df[category_columns]))
+        encoders = (oe, ohe)
+        for sparse in (False, True):
+
+            def encode() -> Any:
+                if sparse:
+                    return preprocess_sparse(df, encoders=encoders)[0]
+                return preprocess(df, predict=True, encoders=encoders)
+
+            X = encode()
+            size = (
+                X.data.nbytes + X.indices.nbytes + X.indptr.nbytes
+                if sparse
+                else X.memory_usage(index=False).sum()
+            )
+            encode_time, encode_peak = measure(encode)
+            print(
+                f"{cardinality:>7} {X.shape[1]:>7} {'sparse' if sparse else 'dense':>6} "
+                f"{size / 2**20:>8.2f} {encode_time * 1000:>11.1f} {encode_peak:>10.2f}"
+            )
+
+
+if __name__ == "__main__":
+    run([int(arg) for arg in sys.argv[1:]] or [1, 10, 50])
+    run_cardinality([10, 100, 1000, 5000])
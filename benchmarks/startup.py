@@ -0,0 +1,59 @@
+"""Measures the cold start time of the service in fresh interpreter processes.
+
+Run from the repository root with ``python -m benchmarks.startup``.
+"""
+import subprocess
+import sys
+import time
+from pathlib import Path
+from statistics import median
+
+root_dir = Path(__file__).parents[1]
+repeat = 5
+model_id = "20bf1dfd-291d-4b12-96a4-af29bf227780"
+applicant = (
+    "{'school': 'GP', 'sex': 'F', 'age': 18, 'address': 'U', 'family_size': 'GT3',"
+    " 'p_status': 'A', 'mother_edu': 4, 'father_edu': 4, 'mother_job': 'teacher',"
+    " 'father_job': 'teacher', 'reason': 'course', 'guardian': 'mother',"
+    " 'travel_time': 2, 'study_time': 2, 'failures': 1, 'school_support': 'yes',"
+    " 'family_support': 'no', 'paid': 'no', 'activities': 'no', 'nursery': 'yes',"
+    " 'higher': 'yes', 'internet': 'no', 'romantic': 'no', 'family_rel': 4,"
+    " 'free_time': 3, 'going_out': 4, 'workday_alcohol': 1, 'weekend_alcohol': 1,"
+    " 'health': 3, 'absences': 6}"
+)
+cases = {
+    "interpreter": "pass",
+    "import app.app": "import app.app",
+    "first model list": (
+        "from app.app import create_app\n"
+        "assert create_app().test_client().get('/api/models').status_code == 200"
+    ),
+    "first prediction": (
+        "from app.app import create_app\n"
+        f"resp = create_app().test_client().post('/api/models/{model_id}/predict',"
+        f" json={applicant})\n"
+        "assert resp.status_code == 200, resp.get_json()"
+    ),
+    "import training stack": "from app.services import ModelService\n"
+    "import sklearn.linear_model, sklearn.metrics, sklearn.model_selection",
+}
+
+
+def measure(code: str) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], cwd=root_dir, check=True)
+        times.append(time.perf_counter() - start)
+    return median(times) * 1000
+
+
+def run() -> None:
+    print(f"median of {repeat} fresh processes")
+    print(f"{'case':>21} {'time (ms)':>10}")
+    for name, code in cases.items():
+        print(f"{name:>21} {measure(code):>10.0f}")
+
+
+if __name__ == "__main__":
+    run()
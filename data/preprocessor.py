@@ -1,13 +1,18 @@
+import copy
+import json
+import os
+import secrets
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Callable
+from typing import (IO, TYPE_CHECKING, Any, Callable, Iterable, Iterator, List,
+                    Optional, Tuple, Union)
 
 import joblib
 import numpy as np
 import pandas as pd
-from sklearn.feature_selection import (chi2, f_classif, f_regression,
-                                       mutual_info_classif,
-                                       mutual_info_regression)
-from sklearn.preprocessing import OneHotEncoder, OrdinalEncoder
+
+if TYPE_CHECKING:
+    from scipy.sparse import csr_matrix
 
 category_columns = [
     "school",
@@ -32,27 +37,134 @@ category_columns = [
 ]
 
 
-def preprocess(df: pd.DataFrame, predict: bool = False) -> pd.DataFrame:
+@contextmanager
+def atomic_write(path: Union[str, Path], mode: str = "w") -> Iterator[IO]:
+    # Write into a temporary file in the same directory and publish it with a
+    # rename, so readers only ever see the previous or the complete new file
+    path = Path(path)
+    while True:
+        # Created like any other file, with the mode left by the umask
+        tmp_path = path.with_name(f".{path.name}.{secrets.token_hex(4)}.tmp")
+        try:
+            fd = os.open(tmp_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o666)
+            break
+        except FileExistsError:
+            continue
+    try:
+        with os.fdopen(fd, mode) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+# Columnar dataset layout: magic, 8-byte little-endian header length, JSON header
+# with the row count and per-column dtype and offset, then the column data
+# blocks, each aligned so that it can be viewed straight from a memory map
+columnar_magic = b"SWEGCOL1"
+columnar_alignment = 64
+
+
+def _downcast(column: pd.Series) -> np.ndarray:
+    values = column.to_numpy()
+    if not np.array_equal(values, np.round(values)):
+        return values
+    # One-hot and ordinal columns become uint8, grades and counts small ints
+    return pd.to_numeric(
+        column.astype(np.int64),
+        downcast="unsigned" if (values >= 0).all() else "integer",
+    ).to_numpy()
+
+
+def write_columnar(df: pd.DataFrame, path: Union[str, Path]) -> None:
+    columns, blocks, offset = [], [], 0
+    for name in df.columns:
+        values = np.ascontiguousarray(_downcast(df[name]))
+        offset += -offset % columnar_alignment
+        columns.append({"name": name, "dtype": values.dtype.str, "offset": offset})
+        blocks.append((offset, values))
+        offset += values.nbytes
+    header = json.dumps({"num_rows": len(df), "columns": columns}).encode()
+    data_start = len(columnar_magic) + 8 + len(header)
+    data_start += -data_start % columnar_alignment
+
+    with atomic_write(path, "wb") as f:
+        f.write(columnar_magic)
+        f.write(len(header).to_bytes(8, "little"))
+        f.write(header)
+        for block_offset, values in blocks:
+            f.seek(data_start + block_offset)
+            f.write(values.tobytes())
+
+
+def read_columnar(
+    path: Union[str, Path], columns: Optional[Iterable[str]] = None
+) -> pd.DataFrame:
+    with open(path, "rb") as f:
+        if f.read(len(columnar_magic)) != columnar_magic:
+            raise ValueError(f"Not a columnar dataset: {path}")
+        header_size = int.from_bytes(f.read(8), "little")
+        header = json.loads(f.read(header_size))
+    data_start = len(columnar_magic) + 8 + header_size
+    data_start += -data_start % columnar_alignment
+
+    # Only the pages of the requested columns are ever read from disk
+    buffer = np.memmap(path, dtype=np.uint8, mode="r")
+    selected = None if columns is None else set(columns)
+    data = {}
+    for column in header["columns"]:
+        if selected is not None and column["name"] not in selected:
+            continue
+        dtype = np.dtype(column["dtype"])
+        start = data_start + column["offset"]
+        end = start + header["num_rows"] * dtype.itemsize
+        data[column["name"]] = buffer[start:end].view(dtype)
+    return pd.DataFrame(data, copy=False)
+
+
+def preprocess(
+    df: pd.DataFrame,
+    predict: bool = False,
+    encoders: Optional[Tuple[Any, Any]] = None,
+) -> pd.DataFrame:
+    # Fitted (ordinal, one-hot) encoders may be given instead of loading them
     oe_path = Path(__file__).parent.joinpath("encoders/ordinal-encoder.pkl")
-    if predict:
+    if predict and encoders:
+        oe = encoders[0]
+    elif predict:
         oe = joblib.load(oe_path)
     else:
+        # Fitting and ranking are offline steps, so their scikit-learn modules
+        # are only imported when needed. Loading a fitted encoder imports the
+        # modules it needs on its own.
+        from sklearn.preprocessing import OrdinalEncoder
+
         oe = OrdinalEncoder()
         oe.fit(df[category_columns])
-        joblib.dump(oe, oe_path)
+        with atomic_write(oe_path, "wb") as f:
+            joblib.dump(oe, f)
     ordinal_df = oe.transform(df[category_columns])
 
     ohe_path = Path(__file__).parent.joinpath("encoders/one-hot-encoder.pkl")
-    if predict:
+    if predict and encoders:
+        ohe = encoders[1]
+    elif predict:
         ohe = joblib.load(ohe_path)
     else:
+        from sklearn.preprocessing import OneHotEncoder
+
         ohe = OneHotEncoder(drop="if_binary", sparse=False)
         ohe.fit(ordinal_df)
-        joblib.dump(ohe, ohe_path)
-    one_hot_df = pd.DataFrame(
-        data=ohe.transform(ordinal_df),
-        columns=ohe.get_feature_names_out(input_features=category_columns),
-    )
+        with atomic_write(ohe_path, "wb") as f:
+            joblib.dump(ohe, f)
+    one_hot_columns = ohe.get_feature_names_out(input_features=category_columns)
+    one_hot_df = pd.DataFrame(data=ohe.transform(ordinal_df), columns=one_hot_columns)
     category_column_set = set(category_columns)
     for column in df.columns:
         if column not in category_column_set:
@@ -60,7 +172,77 @@ def preprocess(df: pd.DataFrame, predict: bool = False) -> pd.DataFrame:
     return one_hot_df
 
 
+def preprocess_sparse(
+    df: pd.DataFrame,
+    columns: Optional[Iterable[str]] = None,
+    encoders: Optional[Tuple[Any, Any]] = None,
+) -> Tuple["csr_matrix", List[str]]:
+    # Same values as preprocess(df, predict=True)[columns], encoded straight into
+    # a CSR matrix by a sparse copy of the one-hot encoder, so that no dense
+    # one-hot column is ever built. Returns the matrix and its column names.
+    from scipy.sparse import csr_matrix, hstack
+
+    if encoders:
+        oe, ohe = encoders
+    else:
+        oe = joblib.load(Path(__file__).parent.joinpath("encoders/ordinal-encoder.pkl"))
+        ohe = joblib.load(
+            Path(__file__).parent.joinpath("encoders/one-hot-encoder.pkl")
+        )
+    one_hot_columns = list(ohe.get_feature_names_out(input_features=category_columns))
+    category_column_set = set(category_columns)
+    other_columns = [
+        column for column in df.columns if column not in category_column_set
+    ]
+    selected = None if columns is None else set(columns)
+    if selected is not None:
+        other_columns = [column for column in other_columns if column in selected]
+
+    one_hot = (
+        copy.copy(ohe)
+        .set_params(sparse=True)
+        .transform(oe.transform(df[category_columns]))
+    )
+    if selected is not None:
+        one_hot_indices = [
+            i for i, column in enumerate(one_hot_columns) if column in selected
+        ]
+        one_hot = one_hot.tocsc()[:, one_hot_indices]
+        one_hot_columns = [one_hot_columns[i] for i in one_hot_indices]
+    X = hstack(
+        [one_hot, csr_matrix(df[other_columns].to_numpy(dtype=float))], format="csr"
+    )
+    return X, one_hot_columns + other_columns
+
+
+def inverse_preprocess(
+    df: pd.DataFrame, encoders: Optional[Tuple[Any, Any]] = None
+) -> pd.DataFrame:
+    # Restores the original category values of a preprocessed dataset
+    if encoders:
+        oe, ohe = encoders
+    else:
+        oe = joblib.load(Path(__file__).parent.joinpath("encoders/ordinal-encoder.pkl"))
+        ohe = joblib.load(
+            Path(__file__).parent.joinpath("encoders/one-hot-encoder.pkl")
+        )
+    one_hot_columns = ohe.get_feature_names_out(input_features=category_columns)
+    restored_df = pd.DataFrame(
+        data=oe.inverse_transform(ohe.inverse_transform(df[one_hot_columns])),
+        columns=category_columns,
+    )
+    one_hot_column_set = set(one_hot_columns)
+    for column in df.columns:
+        if column not in one_hot_column_set:
+            restored_df[column] = df[column]
+    return restored_df
+
+
 def rank_features() -> None:
+    from sklearn.feature_selection import (chi2, f_classif, f_regression,
+                                           mutual_info_classif,
+                                           mutual_info_regression)
+
     df = pd.read_csv("student-mat-preprocessed.csv", sep=";")
     X, y = df.loc[:, ~df.columns.isin(["G1", "G2", "G3"])], df["G3"]
     y_labels = y >= 15.0
@@ -70,7 +252,7 @@ def rank_features() -> None:
         if type(scores) == tuple:
             scores = scores[0]
         indices = np.argsort(scores)[::-1]
-        with open(f"features/ranked-features-{score_func.__name__}.txt", "w") as f:
+        with atomic_write(f"features/ranked-features-{score_func.__name__}.txt") as f:
             for feature in X.columns[indices]:
                 f.write(f"{feature}\n")
 
@@ -84,7 +266,9 @@ if __name__ == "__main__":
     print("Preprocessing the dataset...", end="")
     df = pd.read_csv("student-mat.csv", sep=";")
     df = preprocess(df)
-    df.to_csv(path_or_buf="student-mat-preprocessed.csv", sep=";", index=False)
+    with atomic_write("student-mat-preprocessed.csv") as f:
+        df.to_csv(path_or_buf=f, sep=";", index=False)
+    write_columnar(df, "student-mat-preprocessed.bin")
     print("DONE!")
     print("Ranking the features...", end="")
     rank_features()